@@ -2,12 +2,53 @@ import streamlit as st
 import os
 import sys
 import json
+import threading
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 sys.path.append(os.path.abspath('../../'))
 from tasks.task_3.task_3 import DocumentProcessor
 from tasks.task_4.task_4 import EmbeddingClient
 from tasks.task_5.task_5 import ChromaCollectionCreator
 from tasks.task_8.task_8 import QuizGenerator
-from tasks.task_9.task_9 import QuizManager
+from tasks.task_9.task_9 import QuizManager, QuizSessionStore
+from tasks.task_12.task_12 import ContextBudgeter
+from tasks.task_13.task_13 import BM25Index
+from tasks.task_14.task_14 import StreamingQuizGenerator
+from tasks.task_15.task_15 import ParsedPageCache
+from tasks.task_16.task_16 import HedgedExecutor
+from tasks.task_17.task_17 import AdmissionError, get_admission_controller
+from tasks.task_18.task_18 import ChunkDeduplicator
+from tasks.task_19.task_19 import IndexClient
+from tasks.task_20.task_20 import TopicClusterer
+
+@st.cache_resource
+def get_session_store():
+    """
+    Returns the process-wide QuizSessionStore shared by every browser session.
+    """
+    return QuizSessionStore()
+
+@st.cache_resource
+def get_page_cache():
+    """
+    Returns the process-wide ParsedPageCache so uploads are not re-parsed on every rerun.
+    """
+    return ParsedPageCache()
+
+@st.cache_resource
+def get_call_executor():
+    """
+    Returns the process-wide HedgedExecutor, so every session's LLM calls feed one latency histogram.
+    """
+    return HedgedExecutor(deadline=60.0, max_workers=32)
+
+@st.cache_resource
+def get_index_client():
+    """
+    Returns the process-wide IndexClient when QUIZIFY_INDEX_URL points at a shared index service
+    (e.g. unix:///tmp/quizify-index.sock), or None to keep collections in this process.
+    """
+    url = os.environ.get("QUIZIFY_INDEX_URL")
+    return IndexClient(url) if url else None
 
 if __name__ == "__main__":
     
@@ -17,11 +58,18 @@ if __name__ == "__main__":
         "location": "us-central1"
     }
     
+    store = get_session_store()
+
+    # Restore the quiz session from the URL so it survives page reloads and server restarts
+    if 'quiz_session_id' not in st.session_state:
+        st.session_state['quiz_session_id'] = st.query_params.get("quiz")
+
     # Add Session State
-    if 'question_bank' not in st.session_state or len(st.session_state['question_bank']) == 0:
+    session_id = st.session_state['quiz_session_id']
+    if not session_id or store.question_count(session_id) == 0:
         
-        # Step 1: init the question bank list in st.session_state
-        st.session_state['question_bank'] = []
+        # Step 1: clear any stale quiz session
+        st.session_state['quiz_session_id'] = None
     
         screen = st.empty()
         with screen.container():
@@ -31,12 +79,15 @@ if __name__ == "__main__":
             with st.form("Load Data to Chroma"):
                 st.write("Select PDFs for Ingestion, the topic for the quiz, and click Generate!")
                 
-                processor = DocumentProcessor()
+                processor = DocumentProcessor(page_cache=get_page_cache())
                 processor.ingest_documents()
             
-                embed_client = EmbeddingClient(**embed_config) 
+                embed_client = EmbeddingClient(**embed_config, admission_controller=get_admission_controller())
             
-                chroma_creator = ChromaCollectionCreator(processor, embed_client)
+                chroma_creator = ChromaCollectionCreator(
+                    processor, embed_client, BM25Index(), deduplicator=ChunkDeduplicator(),
+                    index_client=get_index_client(), topic_clusterer=TopicClusterer()
+                )
                 
                 # Step 2: Set topic input and number of questions
                 topic_input = st.text_input("Topic for Generative Quiz", placeholder="Enter the topic of the document")
@@ -51,11 +102,32 @@ if __name__ == "__main__":
                         st.write(f"Generating {num_questions} questions for topic: {topic_input}")
                     
                     # Step 3: Initialize a QuizGenerator class using the topic, number of questions, and the chroma collection
-                    generator = QuizGenerator(topic_input, num_questions, chroma_creator)
-                    question_bank = generator.generate_quiz()
+                    # Stream questions and show each one as soon as its text has been generated
+                    progress = st.empty()
+                    script_run_ctx = get_script_run_ctx()
+                    def show_partial(index, partial):
+                        # Hedged calls stream on executor threads, which need the script context to draw
+                        add_script_run_ctx(threading.current_thread(), script_run_ctx)
+                        if "question" in partial:
+                            progress.info(f"Question {index + 1}: {partial['question']}")
+                    generator = StreamingQuizGenerator(
+                        topic_input, num_questions, chroma_creator, ContextBudgeter(embed_client),
+                        call_executor=get_call_executor(), admission_controller=get_admission_controller(),
+                        on_partial=show_partial
+                    )
+                    try:
+                        question_bank = generator.generate_quiz()
+                    except AdmissionError as e:
+                        st.error(f"Quiz generation is temporarily unavailable: {e}", icon="🚨")
+                        st.stop()
+                    finally:
+                        # The question bank is self-contained, so the collection can go
+                        chroma_creator.delete_chroma_collection()
                     
-                    # Step 4: Initialize the question bank list in st.session_state
-                    st.session_state['question_bank'] = question_bank
+                    # Step 4: Persist the question bank server-side and keep only its session id
+                    session_id = store.create_session(question_bank)
+                    st.session_state['quiz_session_id'] = session_id
+                    st.query_params["quiz"] = session_id
                     # Step 5: Set a display_quiz flag in st.session_state to True
                     st.session_state['display_quiz'] = True
                     # Step 6: Set the question_index to 0 in st.session_state
@@ -63,23 +135,30 @@ if __name__ == "__main__":
 
                     st.rerun()
 
-    elif st.session_state["display_quiz"]:
+    else:
         
         screen = st.empty()
         with screen.container():
             st.header("Generated Quiz Question:")
-            quiz_manager = QuizManager(st.session_state['question_bank'])
+            quiz_manager = QuizManager(store=store, session_id=session_id)
             
             # Step 7: Set index_question using the Quiz Manager method get_question_at_index passing the st.session_state["question_index"]
             current_index = st.session_state.get("question_index", 0)
-            index_question = quiz_manager.get_question_at_index(current_index)
-            
+            index_question = None
+            if quiz_manager.total_questions:
+                index_question = quiz_manager.get_question_at_index(current_index)
+            if index_question is None:
+                # The session expired or was evicted from the store: go back to the quiz builder
+                st.session_state['quiz_session_id'] = None
+                st.query_params.pop("quiz", None)
+                st.rerun()
+
             # Unpack choices for radio button
             choices = [f"{choice['key']}) {choice['value']}" for choice in index_question['choices']]
             
             with st.form("MCQ"):
                 # Display the Question
-                st.write(f"{st.session_state['question_index'] + 1}. {index_question['question']}")
+                st.write(f"{current_index % quiz_manager.total_questions + 1}. {index_question['question']}")
                 answer = st.radio("Choose an answer", choices, index=None)
                 answer_choice = st.form_submit_button("Submit")
                 
@@ -0,0 +1,473 @@
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import logging
+import argparse
+import itertools
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+sys.path.append(os.path.abspath('../../'))
+from tasks.task_3.task_3 import DocumentProcessor
+from tasks.task_5.task_5 import ChromaCollectionCreator
+from tasks.task_8.task_8 import QuizGenerator
+from tasks.task_9.task_9 import QuizManager, QuizSessionStore
+from tasks.task_12.task_12 import ContextBudgeter
+from tasks.task_13.task_13 import BM25Index
+from tasks.task_14.task_14 import StreamingQuizGenerator
+from tasks.task_16.task_16 import HedgedExecutor
+from tasks.task_17.task_17 import AdmissionController, TokenBucket
+from tasks.task_18.task_18 import ChunkDeduplicator
+from tasks.task_19.task_19 import IndexClient
+from tasks.task_20.task_20 import TopicClusterer
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import PyPDFLoader
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+STAGES = ["upload", "index", "generate", "navigate", "total"]
+
+WORDS = (
+    "photosynthesis chlorophyll mitochondria enzyme protein membrane nucleus osmosis diffusion "
+    "gravity momentum velocity acceleration energy friction inertia orbit planet galaxy "
+    "democracy parliament constitution election treaty empire revolution economy trade tariff "
+    "algorithm recursion compiler variable function network protocol database index cache"
+).split()
+
+class LatencyModel:
+    """
+    Log-normal latency distribution, which matches the long right tail seen on real network
+    calls far better than a constant or uniform delay.
+    """
+    def __init__(self, median: float, sigma: float = 0.5, rng: random.Random = None):
+        """
+        :param median: Median latency in seconds. A median of 0 disables the delay.
+        :param sigma: Shape of the distribution; larger values give a heavier tail.
+        :param rng: Optional random generator for reproducible runs.
+        """
+        self.median = median
+        self.sigma = sigma
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.rng.lognormvariate(math.log(self.median), self.sigma)
+
+    def sleep(self) -> float:
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+        return delay
+
+class FakeEmbeddingClient:
+    """
+    Drop-in replacement for the EmbeddingClient from Task 4 that returns deterministic
+    hashed bag-of-words vectors after a simulated Vertex AI round-trip.
+    """
+    def __init__(self, dimensions: int = 256, latency: LatencyModel = None, admission_controller=None):
+        self.dimensions = dimensions
+        self.latency = latency or LatencyModel(0.0)
+        self.admission_controller = admission_controller
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _admit(self, fn):
+        if self.admission_controller is None:
+            return fn()
+        return self.admission_controller.call("embedding", fn)
+
+    def _vector(self, text: str) -> list:
+        vector = [0.0] * self.dimensions
+        for word in text.lower().split():
+            # crc32 rather than hash(), which changes between runs with PYTHONHASHSEED
+            vector[zlib.crc32(word.encode("utf-8")) % self.dimensions] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def _request(self, texts):
+        with self._lock:
+            self.calls += 1
+        self.latency.sleep()
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, query):
+        return self._admit(lambda: self._request([query]))[0]
+
+    def embed_documents(self, documents):
+        return self._admit(lambda: self._request(documents))
+
+class FakeLLM:
+    """
+    Callable stand-in for the VertexAI LLM used by the QuizGenerator. It can be piped into a
+    LangChain chain like the real model and returns a valid quiz question JSON string after a
+    simulated generation delay. A fraction of calls can be made stragglers to mimic tail latency.
+    """
+    def __init__(self, latency: LatencyModel = None, slow_call_rate: float = 0.0, slow_call_latency: float = 0.0,
+                 malformed_rate: float = 0.0, chunk_chars: int = 16):
+        """
+        :param latency: Latency model for a normal call.
+        :param slow_call_rate: Probability in [0, 1] that a call is a straggler.
+        :param slow_call_latency: Extra seconds added to a straggler call.
+        :param malformed_rate: Probability in [0, 1] that a call answers with off-schema output.
+        :param chunk_chars: Characters per chunk when streaming.
+        """
+        self.latency = latency or LatencyModel(0.0)
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_latency = slow_call_latency
+        self.malformed_rate = malformed_rate
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt) -> str:
+        prompt = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        with self._lock:
+            self.calls += 1
+        number = next(self._counter)
+        self.latency.sleep()
+        if self.slow_call_rate and self.latency.rng.random() < self.slow_call_rate:
+            time.sleep(self.slow_call_latency)
+        return self.render_response(number, prompt)
+
+    def stream(self, prompt):
+        """
+        Yields the response in chunks, spreading the sampled latency evenly across them like
+        tokens arriving from a streaming endpoint.
+        """
+        prompt = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        with self._lock:
+            self.calls += 1
+        number = next(self._counter)
+        delay = self.latency.sample()
+        if self.slow_call_rate and self.latency.rng.random() < self.slow_call_rate:
+            delay += self.slow_call_latency
+        response = self.render_response(number, prompt)
+        chunks = [response[start:start + self.chunk_chars] for start in range(0, len(response), self.chunk_chars)]
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield chunk
+
+    def render_response(self, number: int, prompt: str) -> str:
+        if self.malformed_rate and self.latency.rng.random() < self.malformed_rate:
+            return self.render_malformed(number)
+        return self.render_question(number, prompt)
+
+    def render_malformed(self, number: int) -> str:
+        return json.dumps({
+            "question": f"Question {number}: which option is correct?",
+            "options": ["First", "Second", "Third", "Fourth"],
+            "correct": "First",
+            "explanation": "This response uses the wrong schema. " * 20,
+        })
+
+    def render_question(self, number: int, prompt: str) -> str:
+        words = [word for word in prompt.split() if word.isalpha()] or WORDS
+        term = words[number % len(words)]
+        return json.dumps({
+            "question": f"Question {number}: which statement about {term} is correct?",
+            "choices": [
+                {"key": "A", "value": f"{term} is the correct statement"},
+                {"key": "B", "value": "An unrelated distractor"},
+                {"key": "C", "value": "A plausible distractor"},
+                {"key": "D", "value": "None of the above"},
+            ],
+            "answer": "A",
+            "explanation": f"The context describes {term}.",
+        })
+
+def synthetic_pages(num_pages: int, rng: random.Random) -> list:
+    """
+    Builds fake PDF pages made of random paragraphs drawn from a small vocabulary.
+    """
+    pages = []
+    for page_number in range(num_pages):
+        paragraphs = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+            for _ in range(rng.randint(2, 5))
+        ]
+        pages.append(Document(page_content="\n\n".join(paragraphs), metadata={"page": page_number}))
+    return pages
+
+class LoadTestMetrics:
+    """
+    Thread-safe collector of per-stage latencies for all simulated users.
+    """
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def record_error(self, user_id: int, error: Exception):
+        with self._lock:
+            self.errors.append((user_id, repr(error)))
+
+    @staticmethod
+    def percentile(values: list, percent: float) -> float:
+        """
+        Nearest-rank percentile of a list of values.
+        """
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        rank = max(1, math.ceil(percent / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def summary(self) -> dict:
+        return {
+            stage: {
+                "count": len(values),
+                "p50": self.percentile(values, 50),
+                "p95": self.percentile(values, 95),
+                "p99": self.percentile(values, 99),
+                "max": max(values) if values else 0.0,
+            }
+            for stage, values in self.samples.items()
+        }
+
+class QuizLoadTester:
+    """
+    Drives the Task 10 quiz flow headlessly through the core classes for N concurrent users:
+    upload PDFs, build the Chroma collection, generate a quiz and navigate it through the
+    QuizSessionStore. Embedding and LLM calls go to fake backends with realistic latency.
+    """
+    def __init__(self, users=10, iterations=1, num_questions=3, num_pages=20, pdf_paths=None,
+                 embed_client=None, llm=None, parse_latency=None, store=None, token_budget=None, hybrid=True, streaming=False, call_executor=None,
+                 admission_controller=None, index_client=None, broad_topics=False, seed=None):
+        """
+        :param users: Number of simultaneous quiz takers.
+        :param iterations: Number of full quiz flows each user runs.
+        :param num_questions: Questions generated per quiz.
+        :param num_pages: Pages per synthetic upload when no pdf_paths are given.
+        :param pdf_paths: Optional list of real PDF files to upload instead of synthetic pages.
+        :param embed_client: Embedding backend, defaults to a FakeEmbeddingClient.
+        :param llm: LLM backend, defaults to a FakeLLM.
+        :param parse_latency: Latency model for parsing a synthetic upload.
+        :param store: Shared QuizSessionStore, defaults to an in-memory store.
+        :param token_budget: If set, pack prompt context with a ContextBudgeter using this token budget.
+        :param hybrid: Use hybrid BM25 + vector retrieval like the Task 10 app.
+        :param streaming: Stream and incrementally parse LLM output with the StreamingQuizGenerator.
+        :param call_executor: Optional HedgedExecutor shared by all users for deadlines and hedged LLM calls.
+        :param admission_controller: Optional AdmissionController shared by all users for generation requests;
+            pass the same controller to the embedding client to rate limit embeddings too.
+        :param index_client: Optional IndexClient; collections are then built on the shared index service.
+        :param broad_topics: Leave the quiz topic empty, so questions are drawn from the topic clusters.
+        :param seed: Seed for reproducible synthetic documents and latencies.
+        """
+        self.users = users
+        self.iterations = iterations
+        self.num_questions = num_questions
+        self.num_pages = num_pages
+        self.pdf_paths = pdf_paths or []
+        self.rng = random.Random(seed)
+        self.embed_client = embed_client or FakeEmbeddingClient(latency=LatencyModel(0.15, 0.4, self.rng))
+        self.llm = llm or FakeLLM(latency=LatencyModel(1.2, 0.5, self.rng))
+        self.parse_latency = parse_latency or LatencyModel(0.05, 0.3, self.rng)
+        self.store = store or QuizSessionStore(":memory:")
+        self.token_budget = token_budget
+        self.hybrid = hybrid
+        self.streaming = streaming
+        self.call_executor = call_executor
+        self.admission_controller = admission_controller
+        self.index_client = index_client
+        self.broad_topics = broad_topics
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        self.metrics = LoadTestMetrics()
+
+    def upload(self, processor: DocumentProcessor):
+        if self.pdf_paths:
+            for path in self.pdf_paths:
+                processor.pages.extend(PyPDFLoader(path).load())
+        else:
+            self.parse_latency.sleep()
+            processor.pages.extend(synthetic_pages(self.num_pages, random.Random(self.rng.random())))
+
+    def simulate_user(self, user_id: int):
+        """
+        Runs the full quiz flow for one user, recording the duration of every stage.
+        """
+        topic = "" if self.broad_topics else self.rng.choice(WORDS)
+        for _ in range(self.iterations):
+            flow_start = time.perf_counter()
+
+            start = time.perf_counter()
+            processor = DocumentProcessor()
+            self.upload(processor)
+            self.metrics.record("upload", time.perf_counter() - start)
+
+            start = time.perf_counter()
+            chroma_creator = ChromaCollectionCreator(
+                processor, self.embed_client, BM25Index() if self.hybrid else None, deduplicator=ChunkDeduplicator(),
+                index_client=self.index_client, topic_clusterer=TopicClusterer()
+            )
+            chroma_creator.create_chroma_collection()
+            self.metrics.record("index", time.perf_counter() - start)
+
+            start = time.perf_counter()
+            budgeter = ContextBudgeter(self.embed_client, self.token_budget) if self.token_budget else None
+            generator_class = StreamingQuizGenerator if self.streaming else QuizGenerator
+            generator = generator_class(
+                topic, self.num_questions, chroma_creator, budgeter, self.call_executor, self.admission_controller
+            )
+            generator.llm = self.llm
+            try:
+                question_bank = generator.generate_quiz()
+            finally:
+                chroma_creator.delete_chroma_collection()
+            if budgeter:
+                with self._lock:
+                    self.tokens_saved += budgeter.tokens_saved
+            self.metrics.record("generate", time.perf_counter() - start)
+
+            start = time.perf_counter()
+            session_id = self.store.create_session(question_bank)
+            if question_bank:
+                quiz_manager = QuizManager(store=self.store, session_id=session_id)
+                # Walk forward through the quiz and back again, like a user reviewing answers
+                for index in list(range(quiz_manager.total_questions)) * 2:
+                    quiz_manager.get_question_at_index(index)
+            self.metrics.record("navigate", time.perf_counter() - start)
+
+            self.metrics.record("total", time.perf_counter() - flow_start)
+
+    def run(self) -> dict:
+        """
+        Runs all users concurrently and returns throughput, per-stage latency percentiles
+        and peak memory.
+        """
+        tracemalloc.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.users) as executor:
+            futures = {executor.submit(self.simulate_user, user_id): user_id for user_id in range(self.users)}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.metrics.record_error(futures[future], e)
+        elapsed = time.perf_counter() - start
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        completed = len(self.metrics.samples["total"])
+        peak_rss = None
+        if resource is not None:
+            # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            peak_rss = peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+        return {
+            "users": self.users,
+            "completed_flows": completed,
+            "errors": self.metrics.errors,
+            "elapsed_seconds": elapsed,
+            "flows_per_second": completed / elapsed if elapsed else 0.0,
+            "questions_per_second": completed * self.num_questions / elapsed if elapsed else 0.0,
+            "embedding_calls": getattr(self.embed_client, "calls", None),
+            "llm_calls": getattr(self.llm, "calls", None),
+            "context_tokens_saved": self.tokens_saved,
+            "hedge_stats": self.call_executor.stats if self.call_executor else None,
+            "admission_stats": self.admission_controller.stats if self.admission_controller else None,
+            "peak_traced_bytes": peak_traced,
+            "peak_rss_bytes": peak_rss,
+            "stages": self.metrics.summary(),
+        }
+
+def format_report(result: dict) -> str:
+    lines = [
+        f"Users: {result['users']}  Completed flows: {result['completed_flows']}  Errors: {len(result['errors'])}",
+        f"Elapsed: {result['elapsed_seconds']:.2f}s  Throughput: {result['flows_per_second']:.2f} flows/s, "
+        f"{result['questions_per_second']:.2f} questions/s",
+        f"Embedding calls: {result['embedding_calls']}  LLM calls: {result['llm_calls']}  "
+        f"Context tokens saved: {result['context_tokens_saved']}",
+        f"Peak Python memory: {result['peak_traced_bytes'] / 2**20:.1f} MiB"
+        + (f"  Peak RSS: {result['peak_rss_bytes'] / 2**20:.1f} MiB" if result["peak_rss_bytes"] else ""),
+        "",
+        f"{'stage':<10}{'count':>7}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}{'max (s)':>10}",
+    ]
+    for stage, stats in result["stages"].items():
+        lines.append(
+            f"{stage:<10}{stats['count']:>7}{stats['p50']:>10.3f}{stats['p95']:>10.3f}"
+            f"{stats['p99']:>10.3f}{stats['max']:>10.3f}"
+        )
+    if result["hedge_stats"]:
+        lines.append(f"Hedging: {result['hedge_stats']}")
+    if result["admission_stats"]:
+        lines.append(f"Admission: {result['admission_stats']}")
+    for user_id, error in result["errors"][:5]:
+        lines.append(f"user {user_id}: {error}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the Quizify quiz flow with fake backends.")
+    parser.add_argument("--users", type=int, default=10, help="Number of concurrent users")
+    parser.add_argument("--iterations", type=int, default=1, help="Quiz flows per user")
+    parser.add_argument("--questions", type=int, default=3, help="Questions per quiz (max 10)")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per synthetic upload")
+    parser.add_argument("--pdf", nargs="*", default=None, help="Real PDF files to upload instead of synthetic pages")
+    parser.add_argument("--embed-latency", type=float, default=0.15, help="Median embedding latency in seconds")
+    parser.add_argument("--llm-latency", type=float, default=1.2, help="Median LLM latency in seconds")
+    parser.add_argument("--token-budget", type=int, default=None, help="Pack prompt context into this many tokens")
+    parser.add_argument("--no-hybrid", action="store_true", help="Use vector-only retrieval")
+    parser.add_argument("--streaming", action="store_true", help="Stream LLM output and parse it incrementally")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of off-schema LLM responses")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of LLM calls that stall")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="Extra seconds a stalled LLM call takes")
+    parser.add_argument("--hedge", action="store_true", help="Run LLM calls through a HedgedExecutor")
+    parser.add_argument("--deadline", type=float, default=60.0, help="Per-call deadline when hedging")
+    parser.add_argument("--embed-rpm", type=float, default=None, help="Shared embedding quota in requests per minute")
+    parser.add_argument("--generate-rpm", type=float, default=None, help="Shared generation quota in requests per minute")
+    parser.add_argument("--index-url", default=None, help="Build collections on the index service at this URL")
+    parser.add_argument("--broad-topics", action="store_true", help="Generate quizzes with an empty topic")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    args = parser.parse_args()
+
+    # Keep the report readable: silence per-question logs and Streamlit's missing-runtime warnings
+    logging.getLogger("tasks.task_8.task_8").setLevel(logging.WARNING)
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    rng = random.Random(args.seed)
+    admission_controller = None
+    if args.embed_rpm or args.generate_rpm:
+        admission_controller = AdmissionController({
+            kind: TokenBucket(rate=rpm / 60, capacity=max(1.0, rpm / 12))
+            for kind, rpm in (("embedding", args.embed_rpm or 1e6), ("generation", args.generate_rpm or 1e6))
+        })
+    tester = QuizLoadTester(
+        users=args.users,
+        iterations=args.iterations,
+        num_questions=args.questions,
+        num_pages=args.pages,
+        pdf_paths=args.pdf,
+        embed_client=FakeEmbeddingClient(
+            latency=LatencyModel(args.embed_latency, 0.4, rng), admission_controller=admission_controller
+        ),
+        llm=FakeLLM(
+            latency=LatencyModel(args.llm_latency, 0.5, rng),
+            slow_call_rate=args.slow_rate,
+            slow_call_latency=args.slow_latency,
+            malformed_rate=args.malformed_rate,
+        ),
+        token_budget=args.token_budget,
+        hybrid=not args.no_hybrid,
+        streaming=args.streaming,
+        call_executor=HedgedExecutor(deadline=args.deadline, max_workers=4 * args.users) if args.hedge else None,
+        admission_controller=admission_controller,
+        index_client=IndexClient(args.index_url) if args.index_url else None,
+        broad_topics=args.broad_topics,
+        seed=args.seed,
+    )
+    print(format_report(tester.run()))
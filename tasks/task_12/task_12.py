@@ -0,0 +1,153 @@
+import os
+import re
+import sys
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+sys.path.append(os.path.abspath('../../'))
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for Gemini/PaLM style tokenizers (about four characters per token).
+    It avoids a tokenizer dependency and is only used for budgeting.
+    """
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+class ContextBudgeter:
+    """
+    Packs prompt context under a token budget. Instead of injecting the raw text of the top
+    chunk, the budgeter splits the top-k retrieved chunks into sentences, scores every sentence
+    against the topic with one vectorized cosine similarity over cached sentence embeddings,
+    and keeps the most relevant sentences (in document order) until the budget is used up.
+    The packed context is never larger than the raw top chunk it replaces.
+    """
+    def __init__(self, embed_client, token_budget=160, top_k=4, min_sentence_chars=20, cache_size=20000):
+        """
+        :param embed_client: An embedding client exposing embed_query and embed_documents (e.g. EmbeddingClient from Task 4).
+        :param token_budget: Maximum number of (estimated) tokens of context to inject per prompt. Keep it below
+            the size of one raw chunk (about 250 tokens with the Task 5 splitter), or packing saves nothing.
+        :param top_k: Number of retrieved chunks to select sentences from.
+        :param min_sentence_chars: Sentences shorter than this are dropped as noise (page numbers, headers).
+        :param cache_size: Maximum number of sentence embeddings kept in the LRU cache.
+        """
+        self.embed_client = embed_client
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.min_sentence_chars = min_sentence_chars
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (is_query, text) -> unit-normalized np.ndarray
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Resets the per-quiz token accounting.
+        """
+        self.stats = {"calls": 0, "raw_tokens": 0, "packed_tokens": 0}
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.stats["raw_tokens"] - self.stats["packed_tokens"]
+
+    def split_sentences(self, text: str) -> list:
+        sentences = (" ".join(part.split()) for part in SENTENCE_SPLIT.split(text))
+        return [sentence for sentence in sentences if len(sentence) >= self.min_sentence_chars]
+
+    def _embed(self, texts: list, query=False) -> np.ndarray:
+        """
+        Returns unit-normalized embeddings for texts, embedding only the cache misses in a single batch.
+        """
+        keys = [(query, text) for text in texts]
+        with self._lock:
+            missing = [key for key in dict.fromkeys(keys) if key not in self._cache]
+        if missing:
+            if query:
+                vectors = [self.embed_client.embed_query(text) for _, text in missing]
+            else:
+                vectors = self.embed_client.embed_documents([text for _, text in missing])
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+            with self._lock:
+                for key, vector in zip(missing, matrix):
+                    self._cache[key] = vector
+        with self._lock:
+            rows = []
+            for key in keys:
+                self._cache.move_to_end(key)
+                rows.append(self._cache[key])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return np.vstack(rows)
+
+    def pack(self, topic: str, documents: list, raw_context: str = None) -> str:
+        """
+        Selects the most topic-relevant sentences across documents up to the token budget.
+
+        :param topic: The quiz topic the sentences are scored against.
+        :param documents: Retrieved Documents (or strings), best match first.
+        :param raw_context: The context that would have been injected without packing, for token accounting.
+            Defaults to the page content of the first document.
+        :return: The packed context string.
+        """
+        texts = [getattr(document, "page_content", document) for document in documents[:self.top_k]]
+        if raw_context is None:
+            raw_context = texts[0] if texts else ""
+
+        # Never inject more than the raw chunk would have cost
+        budget = min(self.token_budget, estimate_tokens(raw_context))
+
+        # Deduplicate sentences repeated across overlapping chunks, keeping first occurrence order
+        sentences = list(dict.fromkeys(
+            sentence for text in texts for sentence in self.split_sentences(text)
+        ))
+
+        if not sentences or estimate_tokens(raw_context) <= self.token_budget:
+            packed = raw_context  # Nothing to save, so skip the embedding calls
+        elif sum(estimate_tokens(sentence) for sentence in sentences) <= budget:
+            packed = " ".join(sentences)
+        else:
+            topic_vector = self._embed([topic], query=True)[0]
+            scores = self._embed(sentences) @ topic_vector
+
+            selected = []
+            remaining = budget
+            for index in np.argsort(-scores):
+                cost = estimate_tokens(sentences[index])
+                if cost <= remaining:
+                    selected.append(index)
+                    remaining -= cost
+                if remaining < 8:
+                    break
+            packed = " ".join(sentences[index] for index in sorted(selected))
+
+        if not packed or estimate_tokens(packed) >= estimate_tokens(raw_context):
+            packed = raw_context
+
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["raw_tokens"] += estimate_tokens(raw_context)
+            self.stats["packed_tokens"] += estimate_tokens(packed)
+        return packed
+
+if __name__ == "__main__":
+    from tasks.task_4.task_4 import EmbeddingClient
+
+    embed_config = {
+        "model_name": "textembedding-gecko@003",
+        "project": "gemini-quizify-426119",
+        "location": "us-central1"
+    }
+
+    budgeter = ContextBudgeter(EmbeddingClient(**embed_config), token_budget=60)
+    chunks = [
+        "Photosynthesis converts light energy into chemical energy. It takes place in the chloroplasts. "
+        "The weather was pleasant on the day of the experiment.",
+        "Chlorophyll absorbs mostly blue and red light. Page 12 of 300. "
+        "The light-dependent reactions produce ATP and NADPH for the Calvin cycle.",
+    ]
+    print(budgeter.pack("photosynthesis", chunks))
+    print(f"Tokens saved: {budgeter.tokens_saved}")
@@ -0,0 +1,108 @@
+import os
+import re
+import sys
+import math
+from collections import Counter, defaultdict
+sys.path.append(os.path.abspath('../../'))
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+def tokenize(text: str) -> list:
+    """
+    Lowercases text and splits it into word tokens, dropping common English stopwords.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """
+    Local in-memory inverted index with Okapi BM25 scoring. It is built over the same chunks that
+    are embedded into Chroma, so a lexical hit refers to the same chunk a vector hit would.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        """
+        :param k1: Term frequency saturation parameter.
+        :param b: Document length normalization parameter.
+        """
+        self.k1 = k1
+        self.b = b
+        self.documents = []
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.doc_lengths = []
+        self.avg_doc_length = 0.0
+        self.idf = {}
+
+    def build(self, documents: list):
+        """
+        Indexes a list of Documents (or strings), replacing any previous contents.
+        Document ids are their positions in the list.
+        """
+        self.documents = list(documents)
+        self.postings = defaultdict(dict)
+        self.doc_lengths = []
+        for doc_id, document in enumerate(self.documents):
+            tokens = tokenize(getattr(document, "page_content", document))
+            self.doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                self.postings[term][doc_id] = frequency
+
+        total = len(self.documents)
+        self.avg_doc_length = sum(self.doc_lengths) / total if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query: str, k=4) -> list:
+        """
+        Scores every document containing at least one query term.
+
+        :return: A list of (doc_id, score) tuples for the k best documents, best first.
+        """
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, frequency in self.postings[term].items():
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avg_doc_length or 1)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def confidence(self, query: str, results: list) -> float:
+        """
+        Estimates how decisively the lexical results answer the query, in [0, 1]. It is the
+        IDF-weighted share of query terms found in the best document, scaled by how far that
+        document's score is ahead of the runner-up.
+        """
+        terms = set(tokenize(query))
+        if not results or not terms:
+            return 0.0
+        best_id, best_score = results[0]
+        total_weight = sum(self.idf.get(term, 0.0) for term in terms)
+        if not total_weight:
+            return 0.0
+        matched_weight = sum(
+            self.idf[term] for term in terms if best_id in self.postings.get(term, {})
+        )
+        coverage = matched_weight / total_weight
+        runner_up = results[1][1] if len(results) > 1 else 0.0
+        separation = 1 - runner_up / best_score if best_score else 0.0
+        return coverage * separation
+
+if __name__ == "__main__":
+    index = BM25Index()
+    index.build([
+        "Chapter 4: Cellular Respiration. Glycolysis splits glucose into pyruvate.",
+        "Chapter 5: Photosynthesis. Light reactions take place in the thylakoid membrane.",
+        "The Krebs cycle continues cellular respiration in the mitochondria.",
+    ])
+    for query in ["Photosynthesis", "cellular respiration", "quantum gravity"]:
+        results = index.search(query)
+        print(query, results, round(index.confidence(query, results), 3))
@@ -0,0 +1,419 @@
+import os
+import sys
+import json
+import typing
+import logging
+import threading
+from pydantic import BaseModel, TypeAdapter, ValidationError
+sys.path.append(os.path.abspath('../../'))
+from tasks.task_8.task_8 import QuizGenerator, QuizQuestion, Choice
+
+from langchain_core.output_parsers import JsonOutputParser
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = " \t\r\n"
+NUMBER_CHARS = "+-0123456789.eE"
+LITERALS = {"true": True, "false": False, "null": None}
+FENCE_PREFIXES = ("```json", "```JSON", "```")
+
+class StreamAbort(ValueError):
+    """
+    Raised as soon as streamed output can no longer become a valid quiz question.
+    """
+
+def json_kind(annotation) -> str:
+    """
+    Maps a pydantic field annotation to the JSON kind its value must start as.
+    """
+    origin = typing.get_origin(annotation) or annotation
+    if origin in (list, tuple, set):
+        return "array"
+    if origin is str:
+        return "string"
+    if isinstance(origin, type) and issubclass(origin, (BaseModel, dict)):
+        return "object"
+    return None
+
+class IncrementalQuizParser:
+    """
+    Incremental JSON parser for streamed quiz questions. Text is fed in chunks as the LLM emits
+    tokens; the parser keeps a small pushdown state machine, builds the value as it goes and
+    validates each field against the question model as soon as it starts and completes:
+    unknown keys, wrongly typed values, invalid choices and an answer that is not one of the
+    choice keys all raise StreamAbort without waiting for the rest of the response.
+    """
+    def __init__(self, question_model, choice_model):
+        """
+        :param question_model: Pydantic model of a question (QuizQuestion from Task 8).
+        :param choice_model: Pydantic model of a choice (Choice from Task 8).
+        """
+        self.question_model = question_model
+        self.choice_model = choice_model
+        self.question_fields = question_model.model_fields
+        self.choice_fields = choice_model.model_fields
+        self.field_adapters = {
+            name: TypeAdapter(field.annotation) for name, field in self.question_fields.items()
+        }
+        self.result = None
+        self.done = False
+        self.completed_fields = []
+        self._stack = []      # Open containers: [container, pending key, path]
+        self._state = "start"
+        self._prefix = ""     # Text seen before the opening brace
+        self._token = ""      # Current string, number or literal
+        self._escape = None   # Pending escape sequence inside a string
+        self._high_surrogate = None  # \uD800-\uDBFF escape waiting for the low half of its pair
+        self._string_is_key = False
+
+    def feed(self, text: str) -> list:
+        """
+        Consumes a chunk of streamed text.
+
+        :return: The names of the top-level fields completed by this chunk.
+        :raises StreamAbort: If the output is malformed or off-schema.
+        """
+        completed_before = len(self.completed_fields)
+        for char in text:
+            if self.done:
+                break
+            self._consume(char)
+        return self.completed_fields[completed_before:]
+
+    def close(self) -> dict:
+        """
+        Signals the end of the stream and returns the validated question.
+
+        :raises StreamAbort: If the stream ended before a complete question was received.
+        """
+        if self._state == "number" and not self._stack:
+            self._finish_scalar()
+        if not self.done:
+            raise StreamAbort("Stream ended before the question object was complete.")
+        return self.result
+
+    def snapshot(self) -> dict:
+        """
+        Returns the completed top-level fields received so far, for showing partial questions.
+        """
+        if self.result is not None:
+            return dict(self.result)
+        if self._stack:
+            return {name: self._stack[0][0][name] for name in self.completed_fields}
+        return {}
+
+    def _consume(self, char):
+        state = self._state
+        if state == "start":
+            if char == "{":
+                self._open({}, "object")
+                return
+            self._prefix += char
+            stripped = self._prefix.strip()
+            # Allow leading whitespace and a markdown code fence before the object
+            if stripped and not any(
+                fence.startswith(stripped) or stripped.startswith(fence) for fence in FENCE_PREFIXES
+            ):
+                raise StreamAbort(f"Response does not start with a JSON object: {stripped[:40]!r}")
+            if len(stripped) > len(FENCE_PREFIXES[0]):
+                raise StreamAbort(f"Unexpected text before the JSON object: {stripped[:40]!r}")
+        elif state == "string":
+            self._consume_string(char)
+        elif state in ("number", "literal"):
+            if (state == "number" and char in NUMBER_CHARS) or (state == "literal" and char.isalpha()):
+                self._token += char
+                if state == "literal" and not any(word.startswith(self._token) for word in LITERALS):
+                    raise StreamAbort(f"Invalid literal {self._token!r}")
+                return
+            self._finish_scalar()
+            self._consume(char)
+        elif char in WHITESPACE:
+            return
+        elif state == "key_or_end":
+            if char == "}":
+                self._close()
+            elif char == '"':
+                self._start_string(is_key=True)
+            else:
+                raise StreamAbort(f"Expected a key, got {char!r}")
+        elif state == "key":
+            if char != '"':
+                raise StreamAbort(f"Expected a key, got {char!r}")
+            self._start_string(is_key=True)
+        elif state == "colon":
+            if char != ":":
+                raise StreamAbort(f"Expected ':', got {char!r}")
+            self._state = "value"
+        elif state in ("value", "value_or_end"):
+            if state == "value_or_end" and char == "]":
+                self._close()
+            else:
+                self._start_value(char)
+        elif state == "comma_or_end":
+            container = self._stack[-1][0]
+            if char == ",":
+                self._state = "key" if isinstance(container, dict) else "value"
+            elif (char == "}" and isinstance(container, dict)) or (char == "]" and isinstance(container, list)):
+                self._close()
+            else:
+                raise StreamAbort(f"Expected ',' or closing bracket, got {char!r}")
+
+    def _start_value(self, char):
+        kind = {"{": "object", "[": "array", '"': "string"}.get(char)
+        if kind is None:
+            if char in NUMBER_CHARS:
+                kind = "number"
+            elif char.isalpha():
+                kind = "literal"
+            else:
+                raise StreamAbort(f"Unexpected character {char!r}")
+        self._check_kind(self._child_path(), kind)
+        if kind == "object":
+            self._open({}, "object")
+        elif kind == "array":
+            self._open([], "array")
+        elif kind == "string":
+            self._start_string(is_key=False)
+        else:
+            self._state = kind
+            self._token = char
+
+    def _start_string(self, is_key):
+        self._state = "string"
+        self._token = ""
+        self._escape = None
+        self._high_surrogate = None
+        self._string_is_key = is_key
+
+    def _consume_string(self, char):
+        if self._escape is not None:
+            self._escape += char
+            if self._escape.startswith("u") and len(self._escape) < 5:
+                return
+            escape, self._escape = f"\\{self._escape}", None
+            if self._high_surrogate is not None:
+                # Decode the pair together so it becomes one character instead of two lone surrogates
+                escape, self._high_surrogate = self._high_surrogate + escape, None
+            decoded = self._decode_escape(escape)
+            if len(decoded) == 1 and "\ud800" <= decoded <= "\udbff":
+                self._high_surrogate = escape
+                return
+            self._token += decoded
+            return
+        if self._high_surrogate is not None and char != "\\":
+            self._token += self._decode_escape(self._high_surrogate)
+            self._high_surrogate = None
+        if char == "\\":
+            self._escape = ""
+        elif char == '"':
+            if self._string_is_key:
+                self._set_key(self._token)
+            else:
+                self._complete(self._token)
+        else:
+            self._token += char
+
+    @staticmethod
+    def _decode_escape(escape: str) -> str:
+        try:
+            return json.loads(f'"{escape}"')
+        except (json.JSONDecodeError, ValueError):
+            raise StreamAbort(f"Invalid escape sequence {escape}")
+
+    def _finish_scalar(self):
+        token = self._token
+        if self._state == "literal":
+            if token not in LITERALS:
+                raise StreamAbort(f"Invalid literal {token!r}")
+            value = LITERALS[token]
+        else:
+            try:
+                value = json.loads(token)
+            except json.JSONDecodeError:
+                raise StreamAbort(f"Invalid number {token!r}")
+        self._complete(value)
+
+    def _open(self, container, kind):
+        self._stack.append([container, None, self._child_path()])
+        self._state = "key_or_end" if kind == "object" else "value_or_end"
+
+    def _close(self):
+        container, _, _ = self._stack.pop()
+        self._complete(container)
+
+    def _child_path(self) -> tuple:
+        if not self._stack:
+            return ()
+        container, key, path = self._stack[-1]
+        return path + ((key,) if isinstance(container, dict) else (len(container),))
+
+    def _set_key(self, key):
+        container, _, path = self._stack[-1]
+        if key in container:
+            raise StreamAbort(f"Duplicate key {key!r}")
+        allowed = self._allowed_keys(path)
+        if allowed is not None and key not in allowed:
+            raise StreamAbort(f"Unexpected key {key!r} at {list(path) or 'top level'}")
+        self._stack[-1][1] = key
+        self._state = "colon"
+
+    def _complete(self, value):
+        path = self._child_path()
+        self._validate(path, value)
+        if not self._stack:
+            self.result = value
+            self.done = True
+            return
+        container, key, _ = self._stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+            if len(path) == 1:
+                self.completed_fields.append(key)
+        else:
+            container.append(value)
+        self._state = "comma_or_end"
+
+    def _allowed_keys(self, path):
+        if path == ():
+            return self.question_fields
+        if len(path) == 2 and path[0] == "choices":
+            return self.choice_fields
+        return None
+
+    def _check_kind(self, path, kind):
+        if path == ():
+            expected = "object"
+        elif len(path) == 1:
+            expected = json_kind(self.question_fields[path[0]].annotation)
+        elif len(path) == 2 and path[0] == "choices":
+            expected = "object"
+        elif len(path) == 3 and path[0] == "choices":
+            expected = json_kind(self.choice_fields[path[2]].annotation)
+        else:
+            expected = None
+        if expected is not None and kind != expected:
+            raise StreamAbort(f"Expected {expected} at {list(path) or 'top level'}, got {kind}")
+
+    def _validate(self, path, value):
+        try:
+            if path == ():
+                self.question_model.model_validate(value)
+                self._check_answer(value)
+            elif len(path) == 1:
+                self.field_adapters[path[0]].validate_python(value)
+                self._check_answer(self._stack[0][0] | {path[0]: value})
+            elif len(path) == 2 and path[0] == "choices":
+                self.choice_model.model_validate(value)
+        except ValidationError as e:
+            raise StreamAbort(f"Invalid value at {list(path) or 'top level'}: {e.errors()[0]['msg']}")
+
+    @staticmethod
+    def _check_answer(question):
+        if "answer" in question and "choices" in question:
+            keys = {choice["key"] for choice in question["choices"]}
+            if question["answer"] not in keys:
+                raise StreamAbort(f"Answer {question['answer']!r} is not one of the choice keys {sorted(keys)}")
+
+class StreamingQuizGenerator(QuizGenerator):
+    """
+    QuizGenerator that streams each question from the LLM and parses it incrementally with the
+    IncrementalQuizParser. Off-schema or malformed output stops the stream (and the tokens being
+    paid for) as soon as it is detected, and the generate_quiz retry loop asks for a new question.
+    Completed fields are passed to an optional on_partial callback so the UI can show the question
+    before the explanation has been generated.
+    """
+    def __init__(self, topic=None, num_questions=1, vectorstore=None, context_budgeter=None, call_executor=None,
+                 admission_controller=None, priority="interactive", on_partial=None):
+        """
+        :param on_partial: Optional callback called as on_partial(question_index, partial_question)
+            whenever a top-level field of the question being generated completes.
+        """
+        super().__init__(topic, num_questions, vectorstore, context_budgeter, call_executor, admission_controller, priority)
+        self.on_partial = on_partial
+        self.stream_stats = {"completed": 0, "aborted": 0, "cancelled": 0, "chars_streamed": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stat, amount=1):
+        # Hedged attempts stream on executor threads concurrently
+        with self._stats_lock:
+            self.stream_stats[stat] += amount
+
+    def generate_question_with_vectorstore(self):
+        """
+        Streams a quiz question based on the topic provided using a vectorstore
+
+        :return: The validated question dict, or None if the stream was aborted.
+        """
+        if not self.llm:
+            self.init_llm()
+        if not self.vectorstore:
+            raise ValueError("Vectorstore not provided.")
+
+        context = self.get_context()
+        prompt = self.build_prompt(JsonOutputParser(pydantic_object=QuizQuestion))
+        prompt_value = prompt.invoke({"topic": self.topic, "context": context})
+
+        if not self.call_executor:
+            return self.admit(lambda: self.stream_question(prompt_value))
+        try:
+            return self.admit(lambda: self.call_executor.call(
+                lambda cancelled: self.stream_question(prompt_value, cancelled)
+            ))
+        except TimeoutError as e:
+            logger.warning(f"LLM stream missed its deadline: {e}")
+            return None
+
+    def stream_question(self, prompt_value, cancelled=None):
+        """
+        Streams one response for the prompt and parses it incrementally.
+
+        :param prompt_value: The formatted prompt.
+        :param cancelled: Optional threading.Event; the stream is closed as soon as it is set.
+        :return: The validated question dict, or None if the stream was aborted or cancelled.
+        """
+        parser = IncrementalQuizParser(QuizQuestion, Choice)
+        stream = self.llm.stream(prompt_value)
+        try:
+            for chunk in stream:
+                if cancelled is not None and cancelled.is_set():
+                    self._count("cancelled")
+                    return None
+                text = getattr(chunk, "content", chunk)
+                self._count("chars_streamed", len(text))
+                if parser.feed(text) and self.on_partial:
+                    self.on_partial(len(self.question_bank), parser.snapshot())
+                if parser.done:
+                    break  # Ignore anything after the object, e.g. a closing code fence
+            question = parser.close()
+        except StreamAbort as e:
+            self._count("aborted")
+            logger.warning(f"Aborted LLM stream early: {e}")
+            return None
+        finally:
+            # Closing the generator stops the underlying streaming request
+            if hasattr(stream, "close"):
+                stream.close()
+
+        self._count("completed")
+        return question
+
+if __name__ == "__main__":
+    streams = {
+        "valid": '```json\n{"question": "What is 2 + 2?", "choices": [{"key": "A", "value": "4"}, '
+                 '{"key": "B", "value": "5"}], "answer": "A", "explanation": "Basic arithmetic."}\n```',
+        "prose": "Sure! Here is a quiz question about arithmetic: ...",
+        "off-schema": '{"question": "What is 2 + 2?", "options": ["4", "5"], "answer": "A"}',
+        "bad answer": '{"question": "What is 2 + 2?", "choices": [{"key": "A", "value": "4"}], "answer": "E"}',
+    }
+    for name, text in streams.items():
+        parser = IncrementalQuizParser(QuizQuestion, Choice)
+        consumed = 0
+        try:
+            for start in range(0, len(text), 4):  # Feed token-sized chunks
+                consumed = start + 4
+                parser.feed(text[start:consumed])
+                if parser.done:
+                    break
+            print(f"{name}: {parser.close()}")
+        except StreamAbort as e:
+            print(f"{name}: aborted after {min(consumed, len(text))}/{len(text)} chars - {e}")
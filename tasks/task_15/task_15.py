@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+sys.path.append(os.path.abspath('../../'))
+
+import pypdf
+from langchain_core.documents import Document
+
+# Bump when the cached page format or the parsing code changes, so stale entries are ignored
+CACHE_FORMAT_VERSION = 1
+PARSER_VERSION = f"PyPDFLoader/pypdf-{pypdf.__version__}/v{CACHE_FORMAT_VERSION}"
+
+class ParsedPageCache:
+    """
+    On-disk cache of parsed PDF pages keyed by the SHA-256 of the uploaded bytes plus the parser
+    version. Pages are stored zlib-compressed in SQLite, so re-uploading the same file (or a
+    Streamlit rerun while it sits in the uploader) costs a hash and a decompress instead of a full
+    parse. The total compressed size is bounded; least recently used entries are evicted first.
+    """
+    def __init__(self, db_path="page_cache.db", max_bytes=256 * 2**20, parser_version=PARSER_VERSION):
+        """
+        :param db_path: Path of the SQLite database file.
+        :param max_bytes: Upper bound on the total compressed size of cached pages.
+        :param parser_version: Identifies the parser that produced the pages; part of every key.
+        """
+        self.max_bytes = max_bytes
+        self.parser_version = parser_version
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL, payload BLOB NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+
+    def key(self, data: bytes) -> str:
+        return f"{hashlib.sha256(data).hexdigest()}:{self.parser_version}"
+
+    def get(self, data: bytes) -> list:
+        """
+        Returns the cached pages for the PDF bytes as Documents, or None on a miss.
+        """
+        key = self.key(data)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT payload FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.stats["hits"] += 1
+        return [
+            Document(page_content=content, metadata=metadata)
+            for content, metadata in json.loads(zlib.decompress(row[0]))
+        ]
+
+    def put(self, data: bytes, pages: list):
+        """
+        Stores the parsed pages for the PDF bytes, evicting least recently used entries if the
+        cache grows past max_bytes.
+        """
+        payload = zlib.compress(
+            json.dumps([[page.page_content, page.metadata] for page in pages]).encode("utf-8")
+        )
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, size, last_access, payload) VALUES (?, ?, ?, ?)",
+                (self.key(data), len(payload), time.time(), payload),
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total > self.max_bytes:
+                evict = []
+                for key, size in self._conn.execute("SELECT key, size FROM pages ORDER BY last_access"):
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM pages WHERE key = ?", evict)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+
+if __name__ == "__main__":
+    import tempfile
+    import argparse
+    from tasks.task_3.task_3 import DocumentProcessor
+
+    parser = argparse.ArgumentParser(description="Benchmark PDF ingestion with a cold and a warm parsed-page cache.")
+    parser.add_argument("pdf", help="Path of the PDF file to ingest")
+    parser.add_argument("--reruns", type=int, default=5, help="Number of simulated Streamlit reruns")
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        data = f.read()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ParsedPageCache(os.path.join(cache_dir, "page_cache.db"))
+
+        start = time.perf_counter()
+        pages = DocumentProcessor().load_pdf_bytes(data, os.path.basename(args.pdf))
+        uncached = time.perf_counter() - start
+        print(f"Parse without cache: {uncached * 1000:.1f} ms ({len(pages)} pages)")
+
+        processor = DocumentProcessor(page_cache=cache)
+        start = time.perf_counter()
+        processor.load_pdf_bytes(data, os.path.basename(args.pdf))
+        print(f"Cold cache (parse + store): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        timings = []
+        for _ in range(args.reruns):
+            start = time.perf_counter()
+            processor.load_pdf_bytes(data, os.path.basename(args.pdf))
+            timings.append(time.perf_counter() - start)
+        warm = sum(timings) / len(timings)
+        print(f"Warm cache rerun: {warm * 1000:.1f} ms on average over {args.reruns} reruns "
+              f"({uncached / warm:.0f}x faster), cache stats: {cache.stats}")
@@ -0,0 +1,215 @@
+import os
+import sys
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+sys.path.append(os.path.abspath('../../'))
+from tasks.task_17.task_17 import AdmissionError
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when no attempt of a call produced a valid result before its deadline.
+    """
+
+class LatencyHistogram:
+    """
+    Thread-safe latency histogram with logarithmically spaced buckets. Memory stays constant no
+    matter how many calls are recorded, and percentiles are accurate to the bucket width
+    (about 5% with the default growth factor).
+    """
+    def __init__(self, min_latency=0.01, max_latency=600.0, growth=1.05):
+        """
+        :param min_latency: Upper bound of the first bucket, in seconds.
+        :param max_latency: Latencies above this are counted in the last bucket.
+        :param growth: Ratio between the bounds of consecutive buckets.
+        """
+        self.min_latency = min_latency
+        self.growth = growth
+        self.bucket_count = math.ceil(math.log(max_latency / min_latency, growth)) + 1
+        self.counts = [0] * self.bucket_count
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self.min_latency:
+            return 0
+        return min(self.bucket_count - 1, math.ceil(math.log(seconds / self.min_latency, self.growth)))
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.counts[self._bucket(seconds)] += 1
+            self.total += 1
+
+    def percentile(self, percent: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the given percentile, or None if empty.
+        """
+        with self._lock:
+            if not self.total:
+                return None
+            rank = math.ceil(percent / 100 * self.total)
+            seen = 0
+            for bucket, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return self.min_latency * self.growth ** bucket
+        return None
+
+class HedgedExecutor:
+    """
+    Call-execution layer for slow, variable backends such as Gemini. Every call runs with a
+    deadline. If the first attempt is still running once it exceeds the observed latency
+    percentile (p90 by default), a backup attempt is fired; the first valid result wins and the
+    other attempt is told to stop through its cancellation event. Latencies of completed
+    attempts feed the histogram that drives the hedge threshold.
+
+    Python threads cannot be killed, so cancellation is cooperative: the callable receives a
+    threading.Event and should stop (e.g. close its response stream) once it is set.
+    """
+    def __init__(self, deadline=30.0, hedge_percentile=90, min_samples=20, initial_hedge_delay=None,
+                 max_hedges=1, histogram=None, max_workers=16, validate=None, fatal_exceptions=(AdmissionError,)):
+        """
+        :param deadline: Seconds a call may take in total before DeadlineExceeded is raised.
+        :param hedge_percentile: Latency percentile after which a backup attempt is fired.
+        :param min_samples: Recorded latencies needed before the percentile is trusted.
+        :param initial_hedge_delay: Hedge delay used until min_samples latencies are recorded; None disables hedging until then.
+        :param max_hedges: Maximum number of backup attempts per call.
+        :param histogram: A LatencyHistogram, shared between executors to pool observations.
+        :param max_workers: Size of the thread pool running the attempts.
+        :param validate: Predicate a result must pass to be accepted; defaults to "not None".
+        :param fatal_exceptions: Errors raised immediately instead of being hedged, e.g. a request that was
+            rate limited or rejected by an open circuit, where a backup would only spend another token.
+        """
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.initial_hedge_delay = initial_hedge_delay
+        self.max_hedges = max_hedges
+        self.histogram = histogram or LatencyHistogram()
+        self.validate = validate or (lambda result: result is not None)
+        self.fatal_exceptions = fatal_exceptions
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "deadline_exceeded": 0, "failed_attempts": 0}
+        self._stats_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedged-call")
+
+    def hedge_delay(self) -> float:
+        """
+        Returns the current hedge threshold in seconds, or None if hedging is disabled.
+        """
+        if self.histogram.total < self.min_samples:
+            return self.initial_hedge_delay
+        return self.histogram.percentile(self.hedge_percentile)
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def _attempt(self, fn, cancelled):
+        start = time.perf_counter()
+        result = fn(cancelled)
+        if not cancelled.is_set():
+            self.histogram.record(time.perf_counter() - start)
+        return result
+
+    def call(self, fn, deadline=None):
+        """
+        Runs fn(cancelled) with hedging under a deadline.
+
+        :param fn: Callable taking a threading.Event that is set when its attempt should stop.
+        :param deadline: Optional per-call deadline in seconds, overriding the executor default.
+        :return: The first valid result, or the last invalid result if every attempt finished without a valid one.
+        :raises DeadlineExceeded: If no valid result arrived in time.
+        :raises Exception: The last attempt's exception if every attempt raised before the deadline, or
+            the first fatal exception without hedging.
+        """
+        self._count("calls")
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        hedge_delay = self.hedge_delay()
+        attempts = {}  # future -> cancellation event
+        hedges = 0
+        last_error = None
+        last_result = None
+
+        def launch():
+            cancelled = threading.Event()
+            attempts[self._pool.submit(self._attempt, fn, cancelled)] = cancelled
+
+        launch()
+        launch_at = time.monotonic()
+        pending = set(attempts)
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline_at:
+                    break
+                timeout = deadline_at - now
+                can_hedge = hedge_delay is not None and hedges < self.max_hedges
+                if can_hedge:
+                    timeout = min(timeout, max(0.0, launch_at + hedge_delay - now))
+
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except self.fatal_exceptions:
+                        self._count("failed_attempts")
+                        raise
+                    except Exception as e:
+                        last_error = e
+                        self._count("failed_attempts")
+                        continue
+                    if self.validate(result):
+                        if future is not next(iter(attempts)):
+                            self._count("hedge_wins")
+                        return result
+                    last_result = result
+                    self._count("failed_attempts")
+
+                # Fire a backup when the hedge threshold passes, or right away if an attempt failed
+                if can_hedge and (done or time.monotonic() >= launch_at + hedge_delay):
+                    hedges += 1
+                    self._count("hedged")
+                    launch()
+                    launch_at = time.monotonic()
+                    pending = {future for future in attempts if not future.done()}
+        finally:
+            # Tell every attempt still running to stop; the winner has already finished
+            for future, cancelled in attempts.items():
+                cancelled.set()
+                future.cancel()
+
+        if time.monotonic() < deadline_at:
+            if last_error is not None and last_result is None:
+                raise last_error
+            return last_result
+        self._count("deadline_exceeded")
+        raise DeadlineExceeded(f"No valid result within {deadline or self.deadline:.1f}s")
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    import random
+    from tasks.task_11.task_11 import FakeLLM, LatencyModel
+
+    # A fake LLM where 10% of calls stall for an extra 3 seconds
+    llm = FakeLLM(latency=LatencyModel(0.3, 0.3), slow_call_rate=0.1, slow_call_latency=3.0)
+
+    def timed_calls(executor, count=60):
+        latencies = []
+        for _ in range(count):
+            start = time.perf_counter()
+            if executor:
+                executor.call(lambda cancelled: llm("What is photosynthesis?"))
+            else:
+                llm("What is photosynthesis?")
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)], latencies[-1]
+
+    print("Unhedged p50 %.2fs  p95 %.2fs  max %.2fs" % timed_calls(None))
+    executor = HedgedExecutor(deadline=10, min_samples=10, initial_hedge_delay=1.0)
+    print("Hedged   p50 %.2fs  p95 %.2fs  max %.2fs" % timed_calls(executor))
+    print(f"Hedge threshold {executor.hedge_delay():.2f}s, stats: {executor.stats}")
+    executor.shutdown()
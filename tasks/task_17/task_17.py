@@ -0,0 +1,318 @@
+import os
+import sys
+import math
+import time
+import struct
+import logging
+import threading
+sys.path.append(os.path.abspath('../../'))
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; cross-process buckets are disabled there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+class AdmissionError(RuntimeError):
+    """
+    Base class for requests rejected before reaching the backend.
+    """
+
+class RateLimited(AdmissionError):
+    """
+    Raised when a request could not get a token within its timeout.
+    """
+
+class CircuitOpenError(AdmissionError):
+    """
+    Raised when the circuit breaker is open and the backend is considered unhealthy.
+    """
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill continuously at `rate` per second up to `capacity`.
+    A share of the capacity is reserved for interactive requests: background requests only take
+    tokens while the bucket holds more than the reserve, so a bulk job can never starve the
+    users waiting on the UI.
+    """
+    def __init__(self, rate: float, capacity: float, interactive_reserve: float = 0.25):
+        """
+        :param rate: Tokens added per second (e.g. requests per minute / 60).
+        :param capacity: Maximum burst size.
+        :param interactive_reserve: Fraction of the capacity only interactive requests may use.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = capacity * interactive_reserve
+        self._tokens = capacity
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        return self._tokens, self._updated
+
+    def _store(self, tokens, updated):
+        self._tokens, self._updated = tokens, updated
+
+    def _try_take(self, cost, priority) -> float:
+        """
+        Takes cost tokens if available and returns 0, otherwise returns the seconds to wait.
+        """
+        now = time.time()
+        tokens, updated = self._load()
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        # Background requests leave the reserve alone, unless their cost could then never fit
+        floor = min(self.reserve, self.capacity - cost) if priority == BACKGROUND else 0.0
+        if tokens - floor >= cost:
+            self._store(tokens - cost, now)
+            return 0.0
+        self._store(tokens, now)
+        return (cost + floor - tokens) / self.rate
+
+    def _locked_try_take(self, cost, priority) -> float:
+        with self._lock:
+            return self._try_take(cost, priority)
+
+    def acquire(self, cost: float = 1, priority: str = INTERACTIVE, timeout: float = None) -> bool:
+        """
+        Blocks until cost tokens are taken or the timeout expires.
+
+        :return: True if the tokens were taken, False on timeout.
+        :raises ValueError: If cost exceeds the bucket capacity, since the request could never be admitted.
+        """
+        if cost > self.capacity:
+            raise ValueError(f"Request cost {cost} exceeds the bucket capacity {self.capacity}.")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._locked_try_take(cost, priority)
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+class FileTokenBucket(TokenBucket):
+    """
+    TokenBucket whose state lives in a small file guarded by an exclusive flock, so every
+    process on the machine (e.g. several Streamlit replicas) draws from the same quota.
+    """
+    STATE = struct.Struct("dd")
+
+    def __init__(self, path: str, rate: float, capacity: float, interactive_reserve: float = 0.25):
+        """
+        :param path: Path of the shared state file; processes sharing a quota must use the same path.
+        """
+        if fcntl is None:
+            raise RuntimeError("Cross-process token buckets require fcntl (POSIX).")
+        super().__init__(rate, capacity, interactive_reserve)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _load(self):
+        data = os.pread(self._fd, self.STATE.size, 0)
+        if len(data) < self.STATE.size:
+            return self.capacity, time.time()
+        return self.STATE.unpack(data)
+
+    def _store(self, tokens, updated):
+        os.pwrite(self._fd, self.STATE.pack(tokens, updated), 0)
+
+    def _locked_try_take(self, cost, priority) -> float:
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                return self._try_take(cost, priority)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker. After `failure_threshold` consecutive backend failures
+    the circuit opens and requests fail immediately for `recovery_timeout` seconds; then a single
+    trial request is let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, ignored_exceptions=(ValueError,)):
+        """
+        :param failure_threshold: Consecutive failures that open the circuit.
+        :param recovery_timeout: Seconds the circuit stays open before a trial request.
+        :param ignored_exceptions: Exceptions that do not indicate an unhealthy backend,
+            e.g. output parsing errors (LangChain's OutputParserException is a ValueError).
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.ignored_exceptions = ignored_exceptions
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        :raises CircuitOpenError: If the circuit is open (or half-open with a trial already running).
+        """
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    raise CircuitOpenError("Backend is unavailable, failing fast.")
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    raise CircuitOpenError("Backend is recovering, failing fast.")
+                self._trial_in_flight = True
+
+    def release_trial(self):
+        """
+        Frees the half-open trial slot for a request that never reached the backend.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, error: Exception):
+        if isinstance(error, self.ignored_exceptions):
+            self.record_success()
+            return
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Opening circuit after {self.failures} failures: {error!r}")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+class AdmissionController:
+    """
+    Gatekeeper in front of Vertex AI shared by every session in the process. Each request kind
+    (e.g. "embedding", "generation") has its own token bucket and circuit breaker: a request
+    first fails fast if the backend is unhealthy, then waits for a token (interactive requests
+    ahead of background jobs), and finally reports its outcome to the breaker.
+    """
+    def __init__(self, buckets: dict, breakers: dict = None, interactive_timeout=30.0):
+        """
+        :param buckets: Mapping of request kind to TokenBucket.
+        :param breakers: Mapping of request kind to CircuitBreaker; defaults to one breaker per bucket.
+        :param interactive_timeout: Default seconds an interactive request waits for a token.
+        """
+        self.buckets = buckets
+        self.breakers = breakers or {kind: CircuitBreaker() for kind in buckets}
+        self.interactive_timeout = interactive_timeout
+        self.stats = {kind: {"admitted": 0, "rate_limited": 0, "rejected": 0, "failed": 0} for kind in buckets}
+        self._lock = threading.Lock()
+
+    def _count(self, kind, stat):
+        with self._lock:
+            self.stats[kind][stat] += 1
+
+    def call(self, kind: str, fn, cost: float = 1, priority: str = INTERACTIVE, timeout: float = None):
+        """
+        Runs fn() once the request is admitted.
+
+        :param kind: The request kind, a key of buckets.
+        :param fn: Zero-argument callable performing the backend request.
+        :param cost: Tokens the request consumes (number of backend requests it makes).
+        :param priority: INTERACTIVE or BACKGROUND.
+        :param timeout: Seconds to wait for a token; defaults to interactive_timeout for
+            interactive requests and no limit for background ones.
+        :raises CircuitOpenError: If the backend is considered unhealthy.
+        :raises RateLimited: If no token was available in time.
+        :raises ValueError: If cost exceeds the bucket capacity.
+        """
+        breaker = self.breakers[kind]
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            self._count(kind, "rejected")
+            raise
+        if timeout is None and priority == INTERACTIVE:
+            timeout = self.interactive_timeout
+        try:
+            acquired = self.buckets[kind].acquire(cost, priority, timeout)
+        except ValueError:
+            breaker.release_trial()
+            raise
+        if not acquired:
+            self._count(kind, "rate_limited")
+            breaker.release_trial()
+            raise RateLimited(f"No {kind} quota available within {timeout:.0f}s.")
+        self._count(kind, "admitted")
+        try:
+            result = fn()
+        except Exception as e:
+            if not isinstance(e, breaker.ignored_exceptions):
+                self._count(kind, "failed")
+            breaker.record_failure(e)
+            raise
+        breaker.record_success()
+        return result
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Returns the process-wide AdmissionController, created on first use. Quotas are read from the
+    QUIZIFY_EMBED_RPM and QUIZIFY_GENERATE_RPM environment variables (requests per minute). If
+    QUIZIFY_RATE_LIMIT_DIR is set, the buckets are stored there and shared across processes.
+    """
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            quotas = {
+                "embedding": float(os.environ.get("QUIZIFY_EMBED_RPM", 600)),
+                "generation": float(os.environ.get("QUIZIFY_GENERATE_RPM", 60)),
+            }
+            state_dir = os.environ.get("QUIZIFY_RATE_LIMIT_DIR")
+            buckets = {}
+            for kind, rpm in quotas.items():
+                rate, capacity = rpm / 60, max(1.0, math.ceil(rpm / 12))  # Allow five seconds of burst
+                if state_dir:
+                    os.makedirs(state_dir, exist_ok=True)
+                    buckets[kind] = FileTokenBucket(os.path.join(state_dir, f"{kind}.bucket"), rate, capacity)
+                else:
+                    buckets[kind] = TokenBucket(rate, capacity)
+            _controller = AdmissionController(buckets)
+        return _controller
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    controller = AdmissionController({"generation": TokenBucket(rate=5, capacity=5)})
+
+    def request(priority):
+        start = time.perf_counter()
+        controller.call("generation", lambda: None, priority=priority, timeout=None)
+        return priority, time.perf_counter() - start
+
+    # 10 background requests queue up, then 5 interactive ones arrive
+    with ThreadPoolExecutor(max_workers=15) as executor:
+        futures = [executor.submit(request, BACKGROUND) for _ in range(10)]
+        time.sleep(0.05)
+        futures += [executor.submit(request, INTERACTIVE) for _ in range(5)]
+        for priority in (BACKGROUND, INTERACTIVE):
+            waits = [f.result()[1] for f in futures if f.result()[0] == priority]
+            print(f"{priority}: mean wait {sum(waits) / len(waits):.2f}s")
+
+    def failing():
+        raise ConnectionError("429 Resource exhausted")
+
+    for attempt in range(7):
+        try:
+            controller.call("generation", failing)
+        except Exception as e:
+            print(f"attempt {attempt}: {type(e).__name__}: {e}")
+    print(controller.stats)
@@ -0,0 +1,146 @@
+import os
+import re
+import sys
+import hashlib
+from collections import defaultdict
+import numpy as np
+sys.path.append(os.path.abspath('../../'))
+
+WORD_PATTERN = re.compile(r"\w+")
+HASH_PRIME = 4294967311  # Smallest prime above 2**32
+
+def document_name(document) -> str:
+    """
+    Returns the name of the file a chunk came from: the uploaded file name when the loader recorded
+    one (Task 3), otherwise the base name of its source path.
+    """
+    metadata = document.metadata
+    return metadata.get("file_name") or os.path.basename(metadata.get("source", "")) or "document"
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles. The fraction of equal positions in two signatures
+    estimates the Jaccard similarity of the chunks' shingle sets. Hashing is vectorized with
+    NumPy: each shingle is hashed once and permuted with num_perm universal hash functions.
+    """
+    def __init__(self, num_perm=64, shingle_size=3, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # With 32-bit shingle hashes and parameters below 2**32, a * h + b never overflows uint64
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, words: list) -> set:
+        if len(words) < self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, words: list) -> np.ndarray:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big")
+             for s in self.shingles(words)),
+            dtype=np.uint64,
+        )
+        permuted = (np.outer(hashes, self.a) + self.b) % np.uint64(HASH_PRIME)
+        return permuted.min(axis=0)
+
+class ChunkDeduplicator:
+    """
+    Removes near-duplicate chunks (repeated headers, footers, boilerplate and whole pages) between
+    splitting and embedding. Each chunk gets a MinHash signature; locality-sensitive hashing over
+    bands of the signature finds candidate duplicates without comparing every pair, and a
+    candidate whose estimated Jaccard similarity with an earlier kept chunk reaches the threshold
+    is dropped. The kept chunk records how many duplicates were merged into it.
+    """
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle_size=3, min_words=8, embedding_dimensions=768):
+        """
+        :param threshold: Estimated Jaccard similarity of word shingles at which chunks count as duplicates.
+        :param num_perm: MinHash signature length.
+        :param bands: Number of LSH bands; num_perm must be divisible by it.
+        :param shingle_size: Number of words per shingle.
+        :param min_words: Chunks with fewer words are only deduplicated on exact normalized text.
+        :param embedding_dimensions: Embedding size, used to estimate the index space saved.
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands.")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_words = min_words
+        self.embedding_dimensions = embedding_dimensions
+        self.hasher = MinHasher(num_perm, shingle_size)
+
+    def deduplicate(self, documents: list):
+        """
+        Drops near-duplicate Documents, keeping the first occurrence of each.
+
+        :param documents: Chunks as produced by the text splitter.
+        :return: A tuple of (kept documents, report). The report maps each uploaded file name to the
+            number of chunks, chunks dropped, embeddings saved and estimated index bytes saved.
+        """
+        kept = []
+        signatures = {}                  # Position in kept -> MinHash signature
+        band_index = defaultdict(list)   # (band, band bytes) -> positions in kept
+        exact_index = {}                 # Normalized short text -> position in kept
+        report = defaultdict(lambda: {"chunks": 0, "dropped": 0, "embeddings_saved": 0, "index_bytes_saved": 0})
+
+        for document in documents:
+            stats = report[document_name(document)]
+            stats["chunks"] += 1
+            words = WORD_PATTERN.findall(document.page_content.lower())
+
+            duplicate_of = None
+            band_keys = []
+            if len(words) < self.min_words:
+                duplicate_of = exact_index.get(" ".join(words))
+            else:
+                signature = self.hasher.signature(words)
+                band_keys = [
+                    (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                    for band in range(self.bands)
+                ]
+                candidates = {position for key in band_keys for position in band_index.get(key, ())}
+                for position in sorted(candidates):
+                    if np.mean(signatures[position] == signature) >= self.threshold:
+                        duplicate_of = position
+                        break
+
+            if duplicate_of is not None:
+                original = kept[duplicate_of]
+                original.metadata["duplicates"] = original.metadata.get("duplicates", 0) + 1
+                stats["dropped"] += 1
+                stats["embeddings_saved"] += 1
+                stats["index_bytes_saved"] += (
+                    4 * self.embedding_dimensions + len(document.page_content.encode("utf-8"))
+                )
+                continue
+
+            position = len(kept)
+            kept.append(document)
+            if band_keys:
+                signatures[position] = signature
+                for key in band_keys:
+                    band_index[key].append(position)
+            else:
+                exact_index[" ".join(words)] = position
+
+        return kept, dict(report)
+
+if __name__ == "__main__":
+    from langchain_core.documents import Document
+
+    slide = (
+        "Introduction to Cell Biology, Lecture 3. Department of Biology. Learning objectives: describe the "
+        "structure of the cell membrane, explain diffusion and osmosis, compare active and passive transport, "
+        "and identify the role of membrane proteins in signalling. Slide {page} of 40."
+    )
+    chunks = [Document(page_content=slide.format(page=page), metadata={"source": "lecture3.pdf"}) for page in range(1, 6)]
+    chunks.append(Document(
+        page_content="Osmosis is the diffusion of water across a selectively permeable membrane toward higher solute concentration.",
+        metadata={"source": "lecture3.pdf"},
+    ))
+    kept, report = ChunkDeduplicator().deduplicate(chunks)
+    for document in kept:
+        print(document.metadata, document.page_content[:60])
+    print(report)
@@ -0,0 +1,524 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import logging
+import threading
+import socketserver
+import http.client
+from urllib.parse import urlsplit, quote, unquote
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.abspath('../../'))
+
+import chromadb
+from chromadb.errors import InvalidArgumentError
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+class IndexServiceError(RuntimeError):
+    """
+    Raised when the index service rejects a request or cannot be reached.
+    """
+
+class IndexService:
+    """
+    Owns the vector collections for every app replica. Replicas embed chunks and queries
+    themselves (so the shared AdmissionController quotas still apply) and only send vectors here.
+    Collections are cosine-distance Chroma collections; the least recently used ones are dropped
+    once there are more than max_collections or they sit idle past idle_timeout.
+    """
+    def __init__(self, client=None, max_collections=1000, idle_timeout=86400):
+        """
+        :param client: A chromadb client; defaults to an in-memory client.
+        :param max_collections: Upper bound on the number of collections kept.
+        :param idle_timeout: Seconds after which an unused collection is dropped.
+        """
+        self.client = client or chromadb.EphemeralClient()
+        self.max_collections = max_collections
+        self.idle_timeout = idle_timeout
+        self.stats = {"upserts": 0, "query_requests": 0, "queries": 0, "evicted": 0, "missing_collections": 0}
+        self._collections = {}  # name -> (collection, last access), in least recently used order
+        self._lock = threading.Lock()
+        for collection in self.client.list_collections():
+            name = getattr(collection, "name", collection)
+            self._collections[name] = (self.client.get_collection(name), time.time())
+
+    def _touch(self, name, create=False):
+        with self._lock:
+            entry = self._collections.pop(name, None)
+            if entry is None:
+                if not create:
+                    return None
+                collection = self.client.get_or_create_collection(name, metadata={"hnsw:space": "cosine"})
+            else:
+                collection = entry[0]
+            self._collections[name] = (collection, time.time())
+            return collection
+
+    def evict(self):
+        """
+        Drops idle collections and, beyond max_collections, the least recently used ones.
+        """
+        cutoff = time.time() - self.idle_timeout
+        with self._lock:
+            expired = [
+                name for index, (name, (_, last_access)) in enumerate(self._collections.items())
+                if last_access < cutoff or len(self._collections) - index > self.max_collections
+            ]
+            for name in expired:
+                del self._collections[name]
+                self.client.delete_collection(name)
+                self.stats["evicted"] += 1
+
+    def upsert(self, name, ids, documents, metadatas, embeddings):
+        collection = self._touch(name, create=True)
+        collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+        self.stats["upserts"] += 1
+        self.evict()
+
+    def count(self, name):
+        collection = self._touch(name)
+        return None if collection is None else collection.count()
+
+    def items(self, name):
+        """
+        Returns every item of the collection with its document, metadata and embedding.
+        """
+        collection = self._touch(name)
+        if collection is None:
+            raise KeyError(name)
+        data = collection.get(include=["documents", "metadatas", "embeddings"])
+        return {
+            "ids": data["ids"],
+            "documents": data["documents"],
+            "metadatas": [metadata or {} for metadata in data["metadatas"]],
+            "embeddings": [[float(x) for x in embedding] for embedding in data["embeddings"]],
+        }
+
+    def delete(self, name):
+        with self._lock:
+            if self._collections.pop(name, None) is None:
+                return False
+            self.client.delete_collection(name)
+            return True
+
+    def query(self, queries: list) -> list:
+        """
+        Answers a batch of {"collection", "embedding", "k"} queries with one Chroma query per
+        collection. Returns, per query, a list of {"page_content", "metadata", "score"} hits where
+        score is the cosine relevance (1 - cosine distance).
+        """
+        self.stats["query_requests"] += 1
+        self.stats["queries"] += len(queries)
+        results = [[] for _ in queries]
+        by_collection = {}
+        for position, request in enumerate(queries):
+            by_collection.setdefault(request["collection"], []).append(position)
+
+        for name, positions in by_collection.items():
+            collection = self._touch(name)
+            # Batches mix sessions, so an evicted or deleted collection only empties its own queries
+            if collection is None:
+                self.stats["missing_collections"] += 1
+                continue
+            count = collection.count()
+            if count == 0:
+                continue
+            k = min(count, max(queries[position]["k"] for position in positions))
+            response = collection.query(
+                query_embeddings=[queries[position]["embedding"] for position in positions],
+                n_results=k,
+                include=["documents", "metadatas", "distances"],
+            )
+            for row, position in enumerate(positions):
+                hits = zip(response["documents"][row], response["metadatas"][row], response["distances"][row])
+                results[position] = [
+                    {"page_content": text, "metadata": metadata or {}, "score": 1.0 - distance}
+                    for text, metadata, distance in list(hits)[:queries[position]["k"]]
+                ]
+        return results
+
+class IndexRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON over HTTP/1.1 with keep-alive, so clients can reuse pooled connections:
+
+        GET    /health
+        GET    /collections/<name>       -> {"count": n}
+        GET    /collections/<name>/items -> {"ids", "documents", "metadatas", "embeddings"}
+        PUT    /collections/<name>       {"ids", "documents", "metadatas", "embeddings"}
+        DELETE /collections/<name>
+        POST   /query                    {"queries": [{"collection", "embedding", "k"}, ...]} -> {"results": [...]}
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _collection_name(self):
+        # Names are percent-encoded by the client, so a literal "/" only separates a sub-resource
+        prefix = "/collections/"
+        if not self.path.startswith(prefix):
+            return None
+        name, _, resource = self.path[len(prefix):].partition("/")
+        return unquote(name) + (f"/{resource}" if resource else "")
+
+    def _dispatch(self, handler):
+        service = self.server.service
+        try:
+            handler(service)
+        except KeyError as e:
+            self._send(404, {"error": f"Unknown collection {e.args[0]!r}"})
+        except (ValueError, TypeError, InvalidArgumentError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            logger.exception("Index service request failed")
+            self._send(500, {"error": str(e)})
+
+    def do_GET(self):
+        def handle(service):
+            if self.path == "/health":
+                self._send(200, {"status": "ok", "collections": len(service._collections), "stats": service.stats})
+                return
+            name = self._collection_name()
+            if name and name.endswith("/items"):
+                self._send(200, service.items(name[:-len("/items")]))
+                return
+            count = service.count(name) if name else None
+            if count is None:
+                raise KeyError(name)
+            self._send(200, {"count": count})
+        self._dispatch(handle)
+
+    def do_PUT(self):
+        def handle(service):
+            name = self._collection_name()
+            if not name:
+                raise KeyError(self.path)
+            payload = self._read()
+            missing = {"ids", "documents", "metadatas", "embeddings"} - payload.keys()
+            if missing:
+                raise ValueError(f"Missing fields: {', '.join(sorted(missing))}")
+            service.upsert(name, payload["ids"], payload["documents"], payload["metadatas"], payload["embeddings"])
+            self._send(200, {"count": service.count(name)})
+        self._dispatch(handle)
+
+    def do_DELETE(self):
+        def handle(service):
+            name = self._collection_name()
+            if not name or not service.delete(name):
+                raise KeyError(name)
+            self._send(200, {"deleted": name})
+        self._dispatch(handle)
+
+    def do_POST(self):
+        def handle(service):
+            if self.path != "/query":
+                raise KeyError(self.path)
+            self._send(200, {"results": service.query(self._read()["queries"])})
+        self._dispatch(handle)
+
+class UnixIndexServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+class UnixIndexRequestHandler(IndexRequestHandler):
+    def address_string(self):
+        return "unix"
+
+def make_server(url: str, service: IndexService = None):
+    """
+    Creates (without starting) an index server for http://host:port or unix:///path/to.sock.
+    """
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        server = UnixIndexServer(parts.path, UnixIndexRequestHandler)
+    elif parts.scheme == "http":
+        server = ThreadingHTTPServer((parts.hostname or "127.0.0.1", parts.port or 8765), IndexRequestHandler)
+        server.daemon_threads = True
+    else:
+        raise ValueError(f"Unsupported index service URL: {url}")
+    server.service = service or IndexService()
+    return server
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class IndexClient:
+    """
+    Thread-safe client for the index service, shared by every session in a replica. Keep-alive
+    connections are pooled, and single queries issued concurrently by different sessions are
+    coalesced into one batched /query request (waiting at most batch_window seconds).
+    """
+    def __init__(self, url: str, pool_size=8, timeout=30.0, batch_window=0.005, max_batch=64):
+        """
+        :param url: http://host:port or unix:///path/to.sock.
+        :param pool_size: Maximum number of open connections (and concurrent requests).
+        :param timeout: Socket timeout in seconds.
+        :param batch_window: Seconds a query waits for others to share its request; 0 disables coalescing.
+        :param max_batch: Maximum number of queries per request.
+        """
+        parts = urlsplit(url)
+        if parts.scheme == "unix":
+            self._connect = lambda: UnixHTTPConnection(parts.path, timeout=timeout)
+        elif parts.scheme == "http":
+            self._connect = lambda: http.client.HTTPConnection(parts.hostname, parts.port or 8765, timeout=timeout)
+        else:
+            raise ValueError(f"Unsupported index service URL: {url}")
+        self.url = url
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.stats = {"requests": 0, "connections_opened": 0, "queries": 0, "query_requests": 0}
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._stats_lock = threading.Lock()
+        self._pending = []
+        self._pending_cond = threading.Condition()
+        self._flusher = None
+        self._senders = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="index-batch")
+
+    def _count(self, stat, amount=1):
+        with self._stats_lock:
+            self.stats[stat] += amount
+
+    def _open(self):
+        self._count("connections_opened")
+        return self._connect()
+
+    def request(self, method: str, path: str, payload=None) -> dict:
+        """
+        Sends one JSON request over a pooled connection. A stale pooled connection (closed by
+        the server while idle) is replaced and the request retried once; every endpoint is idempotent.
+
+        :raises IndexServiceError: If the service answers with an error or cannot be reached.
+        """
+        body = None if payload is None else json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self._count("requests")
+        with self._slots:
+            try:
+                connection, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                connection, reused = self._open(), False
+            while True:
+                try:
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                    break
+                except (http.client.HTTPException, OSError) as e:
+                    connection.close()
+                    if not reused:
+                        raise IndexServiceError(f"Index service at {self.url} is unreachable: {e}") from e
+                    connection, reused = self._open(), False
+            self._idle.put(connection)
+
+        result = json.loads(data) if data else {}
+        if response.status == 404:
+            raise KeyError(result.get("error", path))
+        if response.status >= 400:
+            raise IndexServiceError(f"Index service error {response.status}: {result.get('error')}")
+        return result
+
+    def upsert(self, collection: str, ids: list, documents: list, metadatas: list, embeddings: list) -> int:
+        path = f"/collections/{quote(collection, safe='')}"
+        return self.request("PUT", path, {
+            "ids": ids, "documents": documents, "metadatas": metadatas, "embeddings": embeddings,
+        })["count"]
+
+    def count(self, collection: str) -> int:
+        return self.request("GET", f"/collections/{quote(collection, safe='')}")["count"]
+
+    def items(self, collection: str) -> dict:
+        return self.request("GET", f"/collections/{quote(collection, safe='')}/items")
+
+    def delete(self, collection: str):
+        self.request("DELETE", f"/collections/{quote(collection, safe='')}")
+
+    def query_many(self, queries: list) -> list:
+        """
+        Runs a batch of (collection, embedding, k) queries in one request.
+
+        :return: Per query, a list of (Document, relevance score) tuples, best match first.
+        """
+        self._count("query_requests")
+        self._count("queries", len(queries))
+        results = self.request("POST", "/query", {"queries": [
+            {"collection": collection, "embedding": [float(x) for x in embedding], "k": k}
+            for collection, embedding, k in queries
+        ]})["results"]
+        return [
+            [(Document(page_content=hit["page_content"], metadata=hit["metadata"]), hit["score"]) for hit in hits]
+            for hits in results
+        ]
+
+    def query(self, collection: str, embedding: list, k: int = 4) -> list:
+        """
+        Runs one query, sharing a request with queries other threads issue at the same time.
+        """
+        if self.batch_window <= 0:
+            return self.query_many([(collection, embedding, k)])[0]
+        future = Future()
+        with self._pending_cond:
+            self._pending.append(((collection, embedding, k), future))
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="index-batcher", daemon=True)
+                self._flusher.start()
+            self._pending_cond.notify_all()
+        return future.result()
+
+    def _flush_loop(self):
+        while True:
+            with self._pending_cond:
+                self._pending_cond.wait_for(lambda: self._pending)
+                # Give concurrent sessions a moment to join the batch
+                self._pending_cond.wait_for(lambda: len(self._pending) >= self.max_batch, timeout=self.batch_window)
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            self._senders.submit(self._send_batch, batch)
+
+    def _send_batch(self, batch):
+        try:
+            results = self.query_many([request for request, _ in batch])
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def close(self):
+        self._senders.shutdown(wait=False)
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class RemoteVectorStore:
+    """
+    The slice of the LangChain Chroma vector store interface ChromaCollectionCreator uses, backed
+    by one collection on the index service. Chunks and queries are embedded locally.
+    """
+    def __init__(self, client: IndexClient, collection_name: str, embedding):
+        self.client = client
+        self.collection_name = collection_name
+        self.embedding = embedding
+
+    @classmethod
+    def from_documents(cls, documents: list, embedding, collection_name: str, client: IndexClient, batch_size=256):
+        store = cls(client, collection_name, embedding)
+        store.add_documents(documents, batch_size)
+        return store
+
+    def add_documents(self, documents: list, batch_size=256):
+        embeddings = self.embedding.embed_documents([document.page_content for document in documents])
+        if embeddings is None or len(embeddings) != len(documents):
+            raise IndexServiceError("Embedding the documents failed.")
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            self.client.upsert(
+                self.collection_name,
+                ids=[str(document.metadata.get("chunk_id", start + offset)) for offset, document in enumerate(batch)],
+                documents=[document.page_content for document in batch],
+                # Chroma only stores scalar metadata values
+                metadatas=[
+                    {key: value for key, value in document.metadata.items()
+                     if isinstance(value, (str, int, float, bool))} or None
+                    for document in batch
+                ],
+                embeddings=[[float(x) for x in vector] for vector in embeddings[start:start + batch_size]],
+            )
+
+    def get(self, include=None) -> dict:
+        """
+        Returns every chunk in the collection, shaped like Chroma.get with documents, metadatas and embeddings.
+        A collection the service no longer has (evicted, or lost in a restart) reads as empty.
+        """
+        try:
+            return self.client.items(self.collection_name)
+        except KeyError:
+            logger.warning(f"Collection {self.collection_name!r} is gone from the index service")
+            return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int = 4) -> list:
+        return self.client.query(self.collection_name, self.embedding.embed_query(query), k)
+
+    def delete_collection(self):
+        try:
+            self.client.delete(self.collection_name)
+        except KeyError:
+            pass  # Already evicted or lost in a restart
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import tempfile
+    from concurrent.futures import as_completed
+    from tasks.task_11.task_11 import FakeEmbeddingClient, LatencyModel, synthetic_pages
+
+    parser = argparse.ArgumentParser(description="Run the shared index service, or benchmark it on localhost.")
+    parser.add_argument("--url", default=None, help="http://host:port or unix:///path/to.sock to serve on")
+    parser.add_argument("--persist-dir", default=None, help="Keep collections on disk in this directory")
+    parser.add_argument("--bench", action="store_true", help="Benchmark batched vs unbatched queries on localhost")
+    parser.add_argument("--sessions", type=int, default=32, help="Concurrent sessions querying during the benchmark")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if not args.bench:
+        client = chromadb.PersistentClient(path=args.persist_dir) if args.persist_dir else None
+        server = make_server(args.url or "http://127.0.0.1:8765", IndexService(client))
+        logger.info(f"Index service listening on {args.url or 'http://127.0.0.1:8765'}")
+        server.serve_forever()
+
+    with tempfile.TemporaryDirectory() as socket_dir:
+        url = args.url or f"unix://{os.path.join(socket_dir, 'index.sock')}"
+        server = make_server(url)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        embed = FakeEmbeddingClient(latency=LatencyModel(0.0001, 0.1))
+        pages = synthetic_pages(40, random.Random(1))
+        chunks = [
+            Document(page_content=page.page_content, metadata={**page.metadata, "chunk_id": chunk_id})
+            for chunk_id, page in enumerate(pages)
+        ]
+        queries = [embed.embed_query(page.page_content[:80]) for page in pages] * 8
+
+        for batch_window in (0.0, 0.005):
+            client = IndexClient(url, pool_size=8, batch_window=batch_window)
+            store = RemoteVectorStore.from_documents(chunks, embed, f"bench-{batch_window}", client)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+                futures = [executor.submit(client.query, store.collection_name, vector, 4) for vector in queries]
+                hits = [future.result() for future in as_completed(futures)]
+            elapsed = time.perf_counter() - start
+            print(f"batch window {batch_window * 1000:.0f} ms: {len(hits)} queries in {elapsed:.2f}s "
+                  f"({len(hits) / elapsed:.0f} q/s), client stats {client.stats}")
+            client.close()
+        print(f"Server stats: {server.service.stats}")
+        server.shutdown()
@@ -0,0 +1,178 @@
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.abspath('../../'))
+
+# Topics that ask for the whole document rather than a subject in it
+BROAD_TOPICS = {"", "general knowledge", "general", "all", "all topics", "everything", "anything", "overview", "review"}
+
+def is_broad_topic(topic) -> bool:
+    return not topic or topic.strip().lower() in BROAD_TOPICS
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class PrecomputedEmbeddings:
+    """
+    Embedding client wrapper that answers embed_documents from vectors already computed for the
+    chunks, so a vector store can be built from them without embedding the chunks twice.
+    Queries and unknown texts are passed through to the wrapped client.
+    """
+    def __init__(self, embed_client, texts: list, vectors: list):
+        self.embed_client = embed_client
+        self.vectors = dict(zip(texts, vectors))
+
+    def embed_documents(self, documents: list) -> list:
+        missing = [text for text in dict.fromkeys(documents) if text not in self.vectors]
+        if missing:
+            self.vectors.update(zip(missing, self.embed_client.embed_documents(missing)))
+        return [self.vectors[text] for text in documents]
+
+    def embed_query(self, query: str):
+        return self.embed_client.embed_query(query)
+
+class TopicClusterer:
+    """
+    Clusters chunk embeddings at index time with spherical mini-batch k-means (plain k-means when
+    the chunks fit in one batch), keeping the centroids and each cluster's chunks ordered from the
+    most central outwards. Quizzes on a broad or empty topic then draw one chunk per cluster, so
+    questions cover the whole document without a query-time embedding call.
+    """
+    def __init__(self, max_clusters=10, min_cluster_size=2, batch_size=256, max_iter=100, tolerance=1e-4, seed=0):
+        """
+        :param max_clusters: Upper bound on the number of clusters (one per question of a full quiz).
+        :param min_cluster_size: Average chunks per cluster below which fewer clusters are used.
+        :param batch_size: Chunks sampled per mini-batch update.
+        :param max_iter: Maximum number of update steps.
+        :param tolerance: Stop once no centroid moves by more than this cosine distance.
+        :param seed: Seed for the centroid initialization and mini-batch sampling.
+        """
+        self.max_clusters = max_clusters
+        self.min_cluster_size = min_cluster_size
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.tolerance = tolerance
+        self.seed = seed
+        self.documents = []
+        self.centroids = None
+        self.clusters = []  # Chunk positions per cluster, most central first; largest cluster first
+
+    @property
+    def fitted(self) -> bool:
+        return bool(self.clusters)
+
+    def _init_centroids(self, X, k, rng) -> np.ndarray:
+        """
+        Greedy k-means++ seeding: each step draws a few candidates with probability proportional to
+        their squared cosine distance from the nearest chosen centroid and keeps the candidate that
+        lowers the total squared distance the most.
+        """
+        trials = 2 + int(np.log(k))
+        centroids = [X[rng.integers(len(X))]]
+        distances = np.maximum(1.0 - X @ centroids[0], 0.0) ** 2
+        for _ in range(1, k):
+            total = distances.sum()
+            if total <= 0:
+                candidates = rng.integers(len(X), size=trials)
+            else:
+                candidates = rng.choice(len(X), size=trials, p=distances / total)
+            candidate_distances = np.minimum(distances, np.maximum(1.0 - X[candidates] @ X.T, 0.0) ** 2)
+            best = np.argmin(candidate_distances.sum(axis=1))
+            centroids.append(X[candidates[best]])
+            distances = candidate_distances[best]
+        return np.vstack(centroids)
+
+    def fit(self, documents: list, embeddings) -> "TopicClusterer":
+        """
+        Clusters the chunks by their embeddings.
+
+        :param documents: The indexed chunks.
+        :param embeddings: One embedding per chunk.
+        """
+        self.documents = list(documents)
+        self.clusters = []
+        if not self.documents:
+            self.centroids = None
+            return self
+
+        X = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        n = len(X)
+        k = max(1, min(self.max_clusters, n // self.min_cluster_size))
+        rng = np.random.default_rng(self.seed)
+        centroids = self._init_centroids(X, k, rng)
+        counts = np.zeros(k)
+
+        for _ in range(self.max_iter):
+            batch = X if n <= self.batch_size else X[rng.choice(n, self.batch_size, replace=False)]
+            labels = np.argmax(batch @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, batch)
+            batch_counts = np.bincount(labels, minlength=k)
+
+            if batch is X:
+                updated = sums  # Full k-means step; the direction of the sum is the spherical mean
+            else:
+                # Each centroid moves towards its batch mean with a per-centroid learning rate of 1 / count
+                counts += batch_counts
+                rate = np.divide(batch_counts, counts, out=np.zeros(k), where=counts > 0)[:, None]
+                means = sums / np.maximum(batch_counts, 1)[:, None]
+                updated = (1 - rate) * centroids + rate * means
+            empty = batch_counts == 0
+            updated[empty] = centroids[empty]
+            updated = normalize_rows(updated)
+
+            shift = np.max(1.0 - np.sum(updated * centroids, axis=1))
+            centroids = updated
+            if shift < self.tolerance:
+                break
+
+        similarities = X @ centroids.T
+        labels = np.argmax(similarities, axis=1)
+        centrality = similarities[np.arange(n), labels]
+        clusters = []
+        for cluster in range(k):
+            members = np.flatnonzero(labels == cluster)
+            if len(members):
+                clusters.append((cluster, members[np.argsort(-centrality[members])]))
+        clusters.sort(key=lambda item: len(item[1]), reverse=True)
+
+        self.centroids = centroids[[cluster for cluster, _ in clusters]]
+        self.clusters = [members.tolist() for _, members in clusters]
+        return self
+
+    def representatives(self):
+        """
+        Yields chunks round-robin across clusters, starting with each cluster's most central chunk,
+        and starts over once every chunk has been yielded.
+        """
+        if not self.clusters:
+            return
+        longest = max(len(members) for members in self.clusters)
+        while True:
+            for depth in range(longest):
+                for members in self.clusters:
+                    if depth < len(members):
+                        yield self.documents[members[depth]]
+
+if __name__ == "__main__":
+    import time
+    from langchain_core.documents import Document
+
+    rng = np.random.default_rng(7)
+    subjects = ["photosynthesis", "the French Revolution", "sorting algorithms", "plate tectonics", "supply and demand"]
+    topic_directions = normalize_rows(rng.normal(size=(len(subjects), 768)))
+    documents, embeddings = [], []
+    for chunk_id in range(2000):
+        subject = chunk_id % len(subjects)
+        documents.append(Document(page_content=f"Chunk {chunk_id} about {subjects[subject]}", metadata={"chunk_id": chunk_id}))
+        embeddings.append(topic_directions[subject] + rng.normal(scale=0.03, size=768))
+
+    clusterer = TopicClusterer(max_clusters=5)
+    start = time.perf_counter()
+    clusterer.fit(documents, embeddings)
+    print(f"Clustered {len(documents)} chunks into {len(clusterer.clusters)} clusters "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms, sizes {[len(c) for c in clusterer.clusters]}")
+    contexts = clusterer.representatives()
+    for question in range(7):
+        print(f"Question {question + 1}: {next(contexts).page_content}")
@@ -0,0 +1,219 @@
+import os
+import re
+import sys
+import logging
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath('../../'))
+from tasks.task_8.task_8 import QuizGenerator
+from tasks.task_14.task_14 import StreamingQuizGenerator
+from tasks.task_17.task_17 import BACKGROUND
+from tasks.task_20.task_20 import is_broad_topic, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+class RankedContextMixin:
+    """
+    Replaces the per-question vector query of a QuizGenerator with a list of chunks ranked ahead
+    of time. Every call (including retries) takes the next chunk, cycling when they run out.
+    """
+    def set_contexts(self, documents: list):
+        self.contexts = documents
+        self.next_context = 0
+        self.context_lock = threading.Lock()
+
+    def get_context(self) -> str:
+        with self.context_lock:
+            if not self.contexts:
+                return "No context available"
+            document = self.contexts[self.next_context % len(self.contexts)]
+            self.next_context += 1
+        return document.page_content
+
+class RankedContextQuizGenerator(RankedContextMixin, QuizGenerator):
+    pass
+
+class RankedContextStreamingQuizGenerator(RankedContextMixin, StreamingQuizGenerator):
+    pass
+
+class BatchQuizGenerator:
+    """
+    Generates quizzes for many (topic, count) pairs against one ChromaCollectionCreator as a single
+    job. All topics are embedded in one embed_documents call and scored against every chunk with one
+    topic x chunk similarity matrix, so no question needs its own query embedding or vector search.
+    Broad or empty topics take chunks round-robin from the creator's topic clusters when it has them.
+    Generations for all topics then run concurrently, and a question already generated for any topic
+    in the batch is rejected and retried.
+    """
+    def __init__(self, vectorstore, llm=None, call_executor=None, admission_controller=None, priority=BACKGROUND,
+                 max_workers=8, retry_limit=5, streaming=False):
+        """
+        :param vectorstore: A ChromaCollectionCreator whose collection has been created.
+        :param llm: The LLM shared by every generation; defaults to the QuizGenerator's Vertex AI model.
+        :param call_executor: An optional HedgedExecutor (Task 16) for deadlines and hedged LLM calls.
+        :param admission_controller: An optional AdmissionController (Task 17) shared with interactive sessions.
+        :param priority: Admission priority of the generations; background by default so users on the UI go first.
+        :param max_workers: Number of questions generated concurrently.
+        :param retry_limit: Attempts per question before it is given up.
+        :param streaming: Stream and incrementally parse LLM output with the StreamingQuizGenerator (Task 14).
+        """
+        self.vectorstore = vectorstore
+        self.llm = llm
+        self.call_executor = call_executor
+        self.admission_controller = admission_controller
+        self.priority = priority
+        self.max_workers = max_workers
+        self.retry_limit = retry_limit
+        self.generator_class = RankedContextStreamingQuizGenerator if streaming else RankedContextQuizGenerator
+        self.stats = {"questions": 0, "generated": 0, "duplicates": 0, "failed": 0, "embedding_calls": 0}
+        self._seen_questions = set()
+        self._lock = threading.Lock()
+
+    def rank_contexts(self, requests: list) -> list:
+        """
+        Ranks the chunks for every topic.
+
+        :param requests: A list of (topic, count) pairs.
+        :return: Per request, the chunks to draw its questions from, best first.
+        """
+        documents, embeddings = self.vectorstore.get_chunk_embeddings()
+        clusterer = getattr(self.vectorstore, "topic_clusterer", None)
+        contexts = [[] for _ in requests]
+        if not documents:
+            return contexts
+
+        focused = []
+        for position, (topic, count) in enumerate(requests):
+            if is_broad_topic(topic) and clusterer is not None and clusterer.fitted:
+                representatives = clusterer.representatives()
+                contexts[position] = [next(representatives) for _ in range(min(len(documents), count * 2))]
+            else:
+                focused.append(position)
+        if not focused:
+            return contexts
+
+        topics = [requests[position][0] or "General Knowledge" for position in focused]
+        unique_topics = list(dict.fromkeys(topics))
+        topic_vectors = self.vectorstore.embed_model.embed_documents(unique_topics)
+        self.stats["embedding_calls"] += 1
+        similarities = normalize_rows(np.asarray(topic_vectors, dtype=np.float32)) @ normalize_rows(embeddings).T
+        rows = {topic: row for row, topic in enumerate(unique_topics)}
+
+        for topic, position in zip(topics, focused):
+            row = rows[topic]
+            # Keep twice as many chunks as questions so retries draw on fresh context
+            keep = min(len(documents), requests[position][1] * 2)
+            best = np.argpartition(-similarities[row], keep - 1)[:keep]
+            best = best[np.argsort(-similarities[row, best])]
+            contexts[position] = [documents[index] for index in best]
+        return contexts
+
+    def is_new_question(self, question) -> bool:
+        """
+        Records the question and returns False if any topic in the batch already produced it.
+        """
+        if not question or "question" not in question:
+            return False
+        key = re.sub(r"\s+", " ", question["question"]).strip().lower()
+        with self._lock:
+            if key in self._seen_questions:
+                self.stats["duplicates"] += 1
+                return False
+            self._seen_questions.add(key)
+            return True
+
+    def generate_question(self, generator):
+        """
+        Generates one question, retrying failed attempts and duplicates up to the retry limit.
+        Any error is logged and retried, so one failing question never aborts the batch; a question
+        that runs out of attempts is counted as failed and returned as None.
+        """
+        for attempt in range(self.retry_limit):
+            try:
+                question = generator.generate_question_with_vectorstore()
+            except Exception as e:
+                logger.warning(f"Question for topic {generator.topic!r} failed: {e!r}")
+                continue
+            if self.is_new_question(question):
+                with self._lock:
+                    self.stats["generated"] += 1
+                return question
+        with self._lock:
+            self.stats["failed"] += 1
+        return None
+
+    def generate(self, requests: list) -> list:
+        """
+        Generates every quiz in the batch.
+
+        :param requests: A list of (topic, count) pairs; topics may repeat.
+        :return: One list of question dicts per request, in request order. A quiz can be shorter than
+            requested if some of its questions failed or only produced duplicates.
+        """
+        if self.vectorstore.db is None:
+            raise ValueError("Chroma Collection has not been created.")
+        if self.llm is None:
+            generator = QuizGenerator()
+            generator.init_llm()
+            self.llm = generator.llm
+        self.stats["questions"] += sum(count for _, count in requests)
+
+        generators = []
+        for (topic, _), contexts in zip(requests, self.rank_contexts(requests)):
+            generator = self.generator_class(
+                topic, 1, self.vectorstore, call_executor=self.call_executor,
+                admission_controller=self.admission_controller, priority=self.priority
+            )
+            generator.llm = self.llm
+            generator.set_contexts(contexts)
+            generators.append(generator)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="batch-quiz") as executor:
+            futures = [
+                [executor.submit(self.generate_question, generator) for _ in range(count)]
+                for generator, (_, count) in zip(generators, requests)
+            ]
+            quizzes = [[future.result() for future in quiz] for quiz in futures]
+        return [[question for question in quiz if question] for quiz in quizzes]
+
+if __name__ == "__main__":
+    import time
+    import random
+    import argparse
+    from tasks.task_3.task_3 import DocumentProcessor
+    from tasks.task_5.task_5 import ChromaCollectionCreator
+    from tasks.task_11.task_11 import FakeEmbeddingClient, FakeLLM, LatencyModel, synthetic_pages, WORDS
+
+    parser = argparse.ArgumentParser(description="Compare per-topic quiz generation with one batch job on fake backends.")
+    parser.add_argument("--topics", type=int, default=20, help="Number of topics")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per topic")
+    parser.add_argument("--embed-latency", type=float, default=0.15, help="Median embedding latency in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Median LLM latency in seconds")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent generations in the batch job")
+    args = parser.parse_args()
+    logging.getLogger("tasks.task_8.task_8").setLevel(logging.WARNING)
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    rng = random.Random(1)
+    embed_client = FakeEmbeddingClient(latency=LatencyModel(args.embed_latency, 0.3, rng))
+    llm = FakeLLM(latency=LatencyModel(args.llm_latency, 0.3, rng))
+    processor = DocumentProcessor()
+    processor.pages.extend(synthetic_pages(60, rng))
+    chroma_creator = ChromaCollectionCreator(processor, embed_client)
+    chroma_creator.create_chroma_collection()
+    requests = [(topic, args.questions) for topic in rng.sample(WORDS, min(args.topics, len(WORDS)))]
+
+    for name in ("per-topic", "batch"):
+        embed_client.calls = llm.calls = 0
+        start = time.perf_counter()
+        if name == "per-topic":
+            quizzes = []
+            for topic, count in requests:
+                generator = QuizGenerator(topic, count, chroma_creator)
+                generator.llm = llm
+                quizzes.append(generator.generate_quiz())
+        else:
+            quizzes = BatchQuizGenerator(chroma_creator, llm, max_workers=args.workers).generate(requests)
+        print(f"{name}: {sum(map(len, quizzes))} questions for {len(requests)} topics in "
+              f"{time.perf_counter() - start:.2f}s, {embed_client.calls} embedding calls, {llm.calls} LLM calls")
@@ -10,8 +10,56 @@ class DocumentProcessor:
     and Langchain's PyPDFLoader. It provides a method to render a file uploader widget, process the
     uploaded PDF files, extract their pages, and display the total number of pages extracted.
     """
-    def __init__(self):
+    def __init__(self, page_cache=None):
+        """
+        :param page_cache: An optional ParsedPageCache (Task 15) consulted before parsing a PDF.
+        """
         self.pages = []  # List to keep track of pages from all documents
+        self.page_cache = page_cache
+
+    def load_pdf_bytes(self, data: bytes, file_name: str) -> list:
+        """
+        Parses the bytes of a PDF into pages, using the page cache when one is configured.
+
+        :param data: The raw bytes of the PDF file.
+        :param file_name: The original name of the file.
+        :return: A list of Documents, one per page, with the original name in metadata["file_name"].
+        """
+        pages = self.page_cache.get(data) if self.page_cache is not None else None
+        if pages is None:
+            pages = self._parse_pdf_bytes(data, file_name)
+
+        # "source" is the temporary file path (the first upload's path for cached pages), so record
+        # the name the user actually uploaded
+        for page in pages:
+            page.metadata["file_name"] = file_name
+        return pages
+
+    def _parse_pdf_bytes(self, data: bytes, file_name: str) -> list:
+        """
+        Parses the PDF with PyPDFLoader through a temporary file and stores the pages in the page cache.
+        """
+        # Generate a unique identifier to append to the file's original name
+        unique_id = uuid.uuid4().hex
+        original_name, file_extension = os.path.splitext(file_name)
+        temp_file_name = f"{original_name}_{unique_id}{file_extension}"
+        temp_file_path = os.path.join(tempfile.gettempdir(), temp_file_name)
+
+        # Write the uploaded PDF to a temporary file
+        with open(temp_file_path, 'wb') as f:
+            f.write(data)
+
+        try:
+            # Process the temporary file
+            loader = PyPDFLoader(temp_file_path)
+            pages = loader.load()
+        finally:
+            # Clean up by deleting the temporary file.
+            os.unlink(temp_file_path)
+
+        if self.page_cache is not None:
+            self.page_cache.put(data, pages)
+        return pages
     
     def ingest_documents(self):
         """
@@ -27,25 +75,11 @@ class DocumentProcessor:
         
         if uploaded_files:
             for uploaded_file in uploaded_files:
-                # Generate a unique identifier to append to the file's original name
-                unique_id = uuid.uuid4().hex
-                original_name, file_extension = os.path.splitext(uploaded_file.name)
-                temp_file_name = f"{original_name}_{unique_id}{file_extension}"
-                temp_file_path = os.path.join(tempfile.gettempdir(), temp_file_name)
-
-                # Write the uploaded PDF to a temporary file
-                with open(temp_file_path, 'wb') as f:
-                    f.write(uploaded_file.getvalue())
-
-                # Step 2: Process the temporary file
-                loader = PyPDFLoader(temp_file_path)
-                pages = loader.load()
+                # Step 2: Process the uploaded file, reusing cached pages for files parsed before
+                pages = self.load_pdf_bytes(uploaded_file.getvalue(), uploaded_file.name)
                 
                 # Add the extracted pages to the 'pages' list.
                 self.pages.extend(pages)
-                
-                # Clean up by deleting the temporary file.
-                os.unlink(temp_file_path)
             
             # Display the total number of pages processed.
             st.write(f"Total pages processed: {len(self.pages)}")
@@ -1,5 +1,8 @@
 from langchain_google_vertexai import VertexAIEmbeddings
 
+# Upper bound on texts Vertex AI embeds per request; each such batch is charged one rate limiter token
+DOCUMENTS_PER_REQUEST = 250
+
 class EmbeddingClient:
     """
     The EmbeddingClient class should be capable of initializing an embedding client with specific configurations
@@ -7,13 +10,21 @@ class EmbeddingClient:
     parameters. This setup will allow the class to utilize Google Cloud's VertexAIEmbeddings for processing text queries.
     """
     
-    def __init__(self, model_name, project, location):
+    def __init__(self, model_name, project, location, admission_controller=None, priority="interactive"):
         # Initialize the VertexAIEmbeddings client with the given parameters
         self.client = VertexAIEmbeddings(
             model_name=model_name,
             project=project,
             location=location
         )
+        # Optional shared AdmissionController (Task 17) rate limiting requests across sessions
+        self.admission_controller = admission_controller
+        self.priority = priority
+
+    def _admit(self, fn, cost=1):
+        if self.admission_controller is None:
+            return fn()
+        return self.admission_controller.call("embedding", fn, cost=cost, priority=self.priority)
         
     def embed_query(self, query):
         """
@@ -22,7 +33,7 @@ class EmbeddingClient:
         :param query: The text query to embed.
         :return: The embeddings for the query or None if the operation fails.
         """
-        vectors = self.client.embed_query(query)
+        vectors = self._admit(lambda: self.client.embed_query(query))
         return vectors
     
     def embed_documents(self, documents):
@@ -33,7 +44,15 @@ class EmbeddingClient:
         :return: A list of embeddings for the given documents.
         """
         try:
-            return self.client.embed_documents(documents)
+            if self.admission_controller is None:
+                return self.client.embed_documents(documents)
+            # Admit one Vertex AI request's worth of documents at a time, so a large upload never
+            # asks the rate limiter for more tokens than its bucket can hold
+            vectors = []
+            for start in range(0, len(documents), DOCUMENTS_PER_REQUEST):
+                batch = documents[start:start + DOCUMENTS_PER_REQUEST]
+                vectors.extend(self._admit(lambda: self.client.embed_documents(batch)))
+            return vectors
         except AttributeError:
             print("Method embed_documents not defined for the client.")
             return None
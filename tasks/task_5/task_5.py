@@ -1,25 +1,63 @@
 import sys
 import os
+import uuid
+import threading
+import chromadb
+import numpy as np
 import streamlit as st
 sys.path.append(os.path.abspath('../../'))
 from tasks.task_3.task_3 import DocumentProcessor
 from tasks.task_4.task_4 import EmbeddingClient
+from tasks.task_19.task_19 import RemoteVectorStore
+from tasks.task_20.task_20 import PrecomputedEmbeddings
 
 # Import Task libraries
 from langchain_core.documents import Document
 from langchain.text_splitter import CharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 
+_chroma_client = None
+_chroma_client_lock = threading.Lock()
+
+def get_chroma_client():
+    """
+    Returns the process-wide in-memory Chroma client. Creating Chroma clients concurrently from
+    several Streamlit sessions races inside chromadb, so the client is created once under a lock.
+    """
+    global _chroma_client
+    with _chroma_client_lock:
+        if _chroma_client is None:
+            _chroma_client = chromadb.EphemeralClient()
+        return _chroma_client
+
 class ChromaCollectionCreator:
-    def __init__(self, processor, embed_model):
+    def __init__(self, processor, embed_model, lexical_index=None, lexical_confidence=0.5, vector_weight=0.5,
+                 deduplicator=None, index_client=None, topic_clusterer=None):
         """
         Initializes the ChromaCollectionCreator with a DocumentProcessor instance and embeddings configuration.
         :param processor: An instance of DocumentProcessor that has processed documents.
         :param embeddings_config: An embedding client for embedding documents.
+        :param lexical_index: An optional BM25Index (Task 13) built over the same chunks for hybrid retrieval.
+        :param lexical_confidence: Lexical confidence at or above which queries skip the embedding round-trip.
+        :param vector_weight: Weight of the vector score when fusing it with the normalized BM25 score.
+        :param deduplicator: An optional ChunkDeduplicator (Task 18) that drops near-duplicate chunks before embedding.
+        :param index_client: An optional IndexClient (Task 19); the collection then lives on the shared index
+            service instead of this process, so app replicas stay stateless.
+        :param topic_clusterer: An optional TopicClusterer (Task 20) fitted on the chunk embeddings at index time,
+            used to cover the whole document when the quiz topic is broad or empty.
         """
         self.processor = processor      # This will hold the DocumentProcessor from Task 3
         self.embed_model = embed_model  # This will hold the EmbeddingClient from Task 4
         self.db = None                  # This will hold the Chroma collection
+        self.collection_name = f"quizify-{uuid.uuid4().hex}"  # Keep each creator's collection separate from other sessions
+        self.lexical_index = lexical_index
+        self.lexical_confidence = lexical_confidence
+        self.vector_weight = vector_weight
+        self.deduplicator = deduplicator
+        self.index_client = index_client
+        self.topic_clusterer = topic_clusterer
+        self.retrieval_stats = {"lexical": 0, "hybrid": 0}
+        self.dedup_report = {}
     
     def create_chroma_collection(self):
         # Step 1: Check for processed documents
@@ -36,11 +74,14 @@ class ChromaCollectionCreator:
             is_separator_regex=False,
         )
 
-        # Ensure each page is a string
-        pages = [str(page) for page in self.processor.pages]
+        # Ensure each page is a Document, keeping the loader's text and metadata rather than its repr
+        pages = [
+            page if isinstance(page, Document) else Document(page_content=str(page))
+            for page in self.processor.pages
+        ]
 
         # Split the documents into smaller text chunks
-        texts = text_splitter.split_documents([Document(page_content=page) for page in pages])
+        texts = text_splitter.split_documents(pages)
         
         if texts:
             st.success(f"Successfully split pages into {len(texts)} documents!", icon="✅")
@@ -48,13 +89,59 @@ class ChromaCollectionCreator:
             st.error("Failed to split pages into documents.", icon="🚨")
             return
 
+        # Drop near-duplicate chunks (headers, footers, repeated pages) before paying to embed them
+        if self.deduplicator is not None:
+            texts, self.dedup_report = self.deduplicator.deduplicate(texts)
+            for file_name, stats in self.dedup_report.items():
+                if stats["dropped"]:
+                    st.info(
+                        f"{file_name}: skipped {stats['dropped']} of {stats['chunks']} chunks as "
+                        f"near-duplicates, saving {stats['embeddings_saved']} embeddings and "
+                        f"~{stats['index_bytes_saved'] / 1024:.0f} KiB of index",
+                        icon="♻️",
+                    )
+
+        # Tag every chunk so lexical and vector hits on the same chunk can be fused
+        for chunk_id, text in enumerate(texts):
+            text.metadata["chunk_id"] = chunk_id
+
         # Step 3: Create the Chroma Collection
         try:
-            self.db = Chroma.from_documents(texts, self.embed_model)
+            embedder = self.embed_model
+            if self.topic_clusterer is not None:
+                # Embed the chunks once and reuse the vectors for the collection and the topic clusters
+                contents = [text.page_content for text in texts]
+                vectors = self.embed_model.embed_documents(contents)
+                embedder = PrecomputedEmbeddings(self.embed_model, contents, vectors)
+            if self.index_client is not None:
+                self.db = RemoteVectorStore.from_documents(texts, embedder, self.collection_name, self.index_client)
+            else:
+                self.db = Chroma.from_documents(texts, embedder, collection_name=self.collection_name, client=get_chroma_client())
             st.success("Successfully created Chroma Collection!", icon="✅")
         except Exception as e:
             st.error(f"Failed to create Chroma Collection: {str(e)}", icon="🚨")
+            return
+
+        # Step 4: Build the lexical index over the same chunks
+        if self.lexical_index is not None:
+            self.lexical_index.build(texts)
+
+        # Step 5: Cluster the chunk embeddings for broad-topic quizzes
+        if self.topic_clusterer is not None:
+            self.topic_clusterer.fit(texts, vectors)
     
+    def delete_chroma_collection(self):
+        """
+        Drops the collection and its embeddings once the quiz no longer needs them. Every creator
+        owns its own collection on the shared client, so without this each submission would keep
+        its embeddings in memory for the life of the server.
+        """
+        if self.db is not None:
+            try:
+                self.db.delete_collection()
+            finally:
+                self.db = None
+
     def query_chroma_collection(self, query) -> Document:
         """
         Queries the created Chroma collection for documents similar to the query.
@@ -63,7 +150,7 @@ class ChromaCollectionCreator:
         Returns the first matching document from the collection with similarity score.
         """
         if self.db:
-            docs = self.db.similarity_search_with_relevance_scores(query)
+            docs = self.search(query)
             if docs:
                 return docs[0]
             else:
@@ -71,6 +158,74 @@ class ChromaCollectionCreator:
         else:
             st.error("Chroma Collection has not been created!", icon="🚨")
 
+    def query_chroma_collection_top_k(self, query, k=4) -> list:
+        """
+        Queries the created Chroma collection for the k documents most similar to the query.
+        :param query: The query string to search for in the Chroma collection.
+        :param k: The number of documents to return.
+
+        Returns a list of (Document, similarity score) tuples, best match first.
+        """
+        if self.db:
+            docs = self.search(query, k=k)
+            if not docs:
+                st.error("No matching documents found!", icon="🚨")
+            return docs
+        st.error("Chroma Collection has not been created!", icon="🚨")
+        return []
+
+    def get_chunk_embeddings(self):
+        """
+        Reads every indexed chunk back from the collection together with its stored embedding, so
+        batch jobs can score all chunks locally instead of issuing one vector query per question.
+
+        Returns a tuple of (list of Documents ordered by chunk id, NumPy array with one embedding per row).
+        """
+        data = self.db.get(include=["documents", "metadatas", "embeddings"])
+        items = sorted(
+            zip(data["documents"], data["metadatas"], data["embeddings"]),
+            key=lambda item: (item[1] or {}).get("chunk_id", 0),
+        )
+        documents = [Document(page_content=text, metadata=metadata or {}) for text, metadata, _ in items]
+        embeddings = np.asarray([embedding for _, _, embedding in items], dtype=np.float32)
+        return documents, embeddings
+
+    def search(self, query, k=4) -> list:
+        """
+        Returns the k best (Document, score) tuples for the query. Without a lexical index this is a
+        plain vector search. With one, queries the lexical index answers confidently (e.g. exact
+        chapter titles or terms) skip the embedding call entirely; all other queries fuse the
+        normalized BM25 scores with the vector relevance scores.
+        """
+        if self.lexical_index is None or len(self.lexical_index) == 0:
+            return self.db.similarity_search_with_relevance_scores(query, k=k)
+
+        candidates = max(k * 2, 10)
+        lexical = self.lexical_index.search(query, k=candidates)
+        top_lexical = lexical[0][1] if lexical else 0.0
+        lexical_scores = {doc_id: score / top_lexical for doc_id, score in lexical}
+
+        # Fast path: a confident lexical match needs no query embedding
+        if self.lexical_index.confidence(query, lexical) >= self.lexical_confidence:
+            self.retrieval_stats["lexical"] += 1
+            return [
+                (self.lexical_index.documents[doc_id], lexical_scores[doc_id])
+                for doc_id, _ in lexical[:k]
+            ]
+
+        self.retrieval_stats["hybrid"] += 1
+        fused = {}
+        for doc_id, score in lexical_scores.items():
+            fused[doc_id] = (1 - self.vector_weight) * score
+        for document, score in self.db.similarity_search_with_relevance_scores(query, k=candidates):
+            doc_id = document.metadata.get("chunk_id")
+            if doc_id is None:
+                continue
+            fused[doc_id] = fused.get(doc_id, 0.0) + self.vector_weight * score
+
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.lexical_index.documents[doc_id], score) for doc_id, score in ranked]
+
 if __name__ == "__main__":
     st.title("Quizify")
     
@@ -9,6 +9,7 @@ sys.path.append(os.path.abspath('../../'))
 from tasks.task_3.task_3 import DocumentProcessor
 from tasks.task_4.task_4 import EmbeddingClient
 from tasks.task_5.task_5 import ChromaCollectionCreator
+from tasks.task_20.task_20 import is_broad_topic
 
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
@@ -29,7 +30,8 @@ class QuizQuestion(BaseModel):
     explanation: str
 
 class QuizGenerator:
-    def __init__(self, topic=None, num_questions=1, vectorstore=None):
+    def __init__(self, topic=None, num_questions=1, vectorstore=None, context_budgeter=None, call_executor=None,
+                 admission_controller=None, priority="interactive"):
         """
         Initializes the QuizGenerator with a required topic, the number of questions for the quiz,
         and an optional vectorstore for querying related information.
@@ -37,6 +39,13 @@ class QuizGenerator:
         :param topic: A string representing the required topic of the quiz.
         :param num_questions: An integer representing the number of questions to generate for the quiz, up to a maximum of 10.
         :param vectorstore: An optional vectorstore instance (e.g., ChromaDB) to be used for querying information related to the quiz topic.
+        :param context_budgeter: An optional ContextBudgeter (Task 12) that packs the most relevant sentences of the
+            top-k chunks into a token budget instead of injecting the raw top chunk.
+        :param call_executor: An optional HedgedExecutor (Task 16) that runs each LLM call with a deadline
+            and hedges slow calls with a backup request.
+        :param admission_controller: An optional AdmissionController (Task 17) shared by all sessions that rate limits
+            generation requests and fails fast while the backend is unhealthy.
+        :param priority: "interactive" for requests a user is waiting on, "background" for bulk jobs.
         """
         if not topic:
             self.topic = "General Knowledge"
@@ -48,7 +57,12 @@ class QuizGenerator:
         self.num_questions = num_questions
 
         self.vectorstore = vectorstore
+        self.context_budgeter = context_budgeter
+        self.call_executor = call_executor
+        self.admission_controller = admission_controller
+        self.priority = priority
         self.llm = None
+        self.cluster_contexts = None  # Round-robin over the topic clusters for broad-topic quizzes
         self.question_bank = [] # Initialize the question bank to store questions
         self.system_template = """
             You are a subject matter expert on the topic: {topic}
@@ -90,6 +104,71 @@ class QuizGenerator:
             max_output_tokens = 500
         )
 
+    def retrieve_context(self) -> str:
+        """
+        Retrieves the raw page content of the top matching chunk for the topic from the vectorstore.
+        """
+        context_documents = self.vectorstore.query_chroma_collection(self.topic)
+        if context_documents:
+            if isinstance(context_documents[0], tuple):
+                context_document = context_documents[0][0]  # Extract the Document object from the tuple
+            else:
+                context_document = context_documents[0]  # Assume it's a list of Document objects directly
+            return context_document.page_content
+        return "No context available"
+
+    def retrieve_budgeted_context(self) -> str:
+        """
+        Retrieves the top-k chunks for the topic and packs their most relevant sentences into the
+        context budgeter's token budget.
+        """
+        results = self.vectorstore.query_chroma_collection_top_k(self.topic, k=self.context_budgeter.top_k)
+        if not results:
+            return "No context available"
+        documents = [document for document, _ in results]
+        return self.context_budgeter.pack(self.topic, documents)
+
+    def retrieve_cluster_context(self, clusterer) -> str:
+        """
+        Retrieves the next chunk round-robin across the vectorstore's topic clusters, so every question
+        of a broad quiz (and every retry) draws on a different part of the documents without embedding the topic.
+        """
+        if self.cluster_contexts is None:
+            self.cluster_contexts = clusterer.representatives()
+        return next(self.cluster_contexts).page_content
+
+    def admit(self, fn):
+        """
+        Runs a generation request through the admission controller, if one is configured. With a
+        call executor, fn is the whole hedged call, so its hedges share one token and a missed
+        deadline counts as a backend failure.
+        """
+        if self.admission_controller is None:
+            return fn()
+        return self.admission_controller.call("generation", fn, priority=self.priority)
+
+    def get_context(self) -> str:
+        """
+        Retrieves the prompt context for the topic, packed into the token budget if a context budgeter is set.
+        Broad or empty topics draw one chunk per topic cluster instead, when the vectorstore has them.
+        """
+        clusterer = getattr(self.vectorstore, "topic_clusterer", None)
+        if clusterer is not None and clusterer.fitted and is_broad_topic(self.topic):
+            return self.retrieve_cluster_context(clusterer)
+        if self.context_budgeter:
+            return self.retrieve_budgeted_context()
+        return self.retrieve_context()
+
+    def build_prompt(self, parser) -> PromptTemplate:
+        """
+        Builds the question prompt with the parser's format instructions injected.
+        """
+        return PromptTemplate(
+            template=self.system_template,
+            input_variables=["topic", "context"],
+            partial_variables={"format_instructions": parser.get_format_instructions()},
+        )
+
     def generate_question_with_vectorstore(self):
         """
         Generates a quiz question based on the topic provided using a vectorstore
@@ -102,29 +181,27 @@ class QuizGenerator:
             raise ValueError("Vectorstore not provided.")
 
         # Retrieve context from the vectorstore
-        context_documents = self.vectorstore.query_chroma_collection(self.topic)
-        if context_documents:
-            if isinstance(context_documents[0], tuple):
-                context_document = context_documents[0][0]  # Extract the Document object from the tuple
-            else:
-                context_document = context_documents[0]  # Assume it's a list of Document objects directly
-            context = context_document.page_content
-        else:
-            context = "No context available"
+        context = self.get_context()
 
         # Set up a parser + inject instructions into the prompt template
         parser = JsonOutputParser(pydantic_object=QuizQuestion)
-        prompt = PromptTemplate(
-            template=self.system_template,
-            input_variables=["topic", "context"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
-        )
+        prompt = self.build_prompt(parser)
 
         # Create the chain with prompt, model, and parser
         chain = prompt | self.llm | parser
 
         # Generate the quiz question
-        response = chain.invoke({"topic": self.topic, "context": context})
+        inputs = {"topic": self.topic, "context": context}
+        if self.call_executor:
+            # Admit once per question, outside the executor: hedged attempts share the token, the
+            # wait for a token does not count as latency, and deadline misses reach the breaker
+            try:
+                response = self.admit(lambda: self.call_executor.call(lambda cancelled: chain.invoke(inputs)))
+            except TimeoutError as e:
+                logger.warning(f"LLM call missed its deadline: {e}")
+                return None
+        else:
+            response = self.admit(lambda: chain.invoke(inputs))
 
         return response
 
@@ -147,7 +224,10 @@ class QuizGenerator:
         Note: This method relies on `generate_question_with_vectorstore` for question generation and `validate_question` for ensuring question uniqueness. Ensure `question_bank` is properly initialized and managed.
         """
         self.question_bank = [] # Reset the question bank
+        self.cluster_contexts = None
         retry_limit = 5
+        if self.context_budgeter:
+            self.context_budgeter.reset_stats()
 
         for _ in range(self.num_questions):
             for attempt in range(retry_limit):
@@ -164,6 +244,13 @@ class QuizGenerator:
             else:
                 logger.error("Duplicate or invalid question detected after retries.")
 
+        if self.context_budgeter:
+            stats = self.context_budgeter.stats
+            logger.info(
+                f"Context budget: {stats['packed_tokens']} context tokens over {stats['calls']} calls, "
+                f"{self.context_budgeter.tokens_saved} tokens saved for this quiz"
+            )
+
         return self.question_bank
 
     def validate_question(self, question: QuizQuestion) -> bool:
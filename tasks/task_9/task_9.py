@@ -2,19 +2,207 @@ import streamlit as st
 import os
 import sys
 import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
 sys.path.append(os.path.abspath('../../'))
 from tasks.task_3.task_3 import DocumentProcessor
 from tasks.task_4.task_4 import EmbeddingClient
 from tasks.task_5.task_5 import ChromaCollectionCreator
 from tasks.task_8.task_8 import QuizGenerator
 
+class CompactQuestion:
+    """
+    Compact, slotted record for a single quiz question. Choices are stored as a tuple of
+    (key, value) pairs with interned keys, so the "A"/"B"/"C"/"D" strings are shared across
+    every question held by the process instead of being duplicated per dict.
+    """
+    __slots__ = ("question", "choices", "answer", "explanation")
+
+    def __init__(self, question, choices, answer, explanation):
+        self.question = question
+        self.choices = choices
+        self.answer = answer
+        self.explanation = explanation
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Builds a CompactQuestion from the raw question dict returned by the QuizGenerator.
+        """
+        choices = tuple(
+            (sys.intern(str(choice["key"])), str(choice["value"]))
+            for choice in data.get("choices", [])
+        )
+        return cls(
+            question=data.get("question", ""),
+            choices=choices,
+            answer=sys.intern(str(data.get("answer", ""))),
+            explanation=data.get("explanation", ""),
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Returns the question in the same dict shape the QuizGenerator produces.
+        """
+        return {
+            "question": self.question,
+            "choices": [{"key": key, "value": value} for key, value in self.choices],
+            "answer": self.answer,
+            "explanation": self.explanation,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps([self.question, self.choices, self.answer, self.explanation])
+
+    @classmethod
+    def from_json(cls, payload: str):
+        question, choices, answer, explanation = json.loads(payload)
+        choices = tuple((sys.intern(key), value) for key, value in choices)
+        return cls(question, choices, sys.intern(answer), explanation)
+
+class QuizSessionStore:
+    """
+    Server-side store for generated quizzes. Each quiz session is persisted to SQLite as one
+    compact row per question, so sessions survive server restarts and the browser only needs
+    to hold a session id. Recently read questions are kept in a bounded in-memory LRU cache,
+    and idle sessions are evicted least-recently-used first once the store is over capacity
+    or past the idle timeout.
+    """
+    def __init__(self, db_path="quiz_sessions.db", max_sessions=1000, idle_timeout=24 * 3600, cache_size=512):
+        """
+        :param db_path: Path of the SQLite database file (":memory:" for a non-persistent store).
+        :param max_sessions: Maximum number of sessions kept before the least recently used are evicted.
+        :param idle_timeout: Seconds after which an untouched session is considered idle and evicted.
+        :param cache_size: Maximum number of questions held in the in-memory LRU cache.
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (session_id, index) -> CompactQuestion
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, last_access REAL NOT NULL, total_questions INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                "session_id TEXT NOT NULL, idx INTEGER NOT NULL, payload TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, idx))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)")
+
+    def create_session(self, questions: list) -> str:
+        """
+        Stores a list of raw question dicts as a new quiz session.
+
+        :param questions: The question bank returned by QuizGenerator.generate_quiz().
+        :return: The id of the new session.
+        """
+        session_id = uuid.uuid4().hex
+        rows = [
+            (session_id, index, CompactQuestion.from_dict(question).to_json())
+            for index, question in enumerate(questions)
+        ]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, last_access, total_questions) VALUES (?, ?, ?)",
+                (session_id, time.time(), len(rows)),
+            )
+            self._conn.executemany("INSERT INTO questions (session_id, idx, payload) VALUES (?, ?, ?)", rows)
+            self._evict_locked()
+        return session_id
+
+    def question_count(self, session_id: str) -> int:
+        """
+        Returns the number of questions in a session, or 0 if the session does not exist.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT total_questions FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_question(self, session_id: str, index: int) -> dict:
+        """
+        Pages in a single question of a session by index and marks the session as recently used.
+
+        :return: The question as a dict, or None if it does not exist.
+        """
+        key = (session_id, index)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id)
+            )
+            compact = self._cache.get(key)
+            if compact is not None:
+                self._cache.move_to_end(key)
+            else:
+                row = self._conn.execute(
+                    "SELECT payload FROM questions WHERE session_id = ? AND idx = ?", key
+                ).fetchone()
+                if row is None:
+                    return None
+                compact = CompactQuestion.from_json(row[0])
+                self._cache[key] = compact
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return compact.to_dict()
+
+    def delete_session(self, session_id: str):
+        with self._lock, self._conn:
+            self._delete_locked([session_id])
+
+    def evict_idle_sessions(self):
+        """
+        Removes sessions idle for longer than idle_timeout and, if the store is still over
+        max_sessions, the least recently used sessions beyond that limit.
+        """
+        with self._lock, self._conn:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        cutoff = time.time() - self.idle_timeout
+        expired = [
+            row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_access < ?", (cutoff,)
+            )
+        ]
+        overflow = [
+            row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_access >= ? "
+                "ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                (cutoff, self.max_sessions),
+            )
+        ]
+        self._delete_locked(expired + overflow)
+
+    def _delete_locked(self, session_ids):
+        if not session_ids:
+            return
+        self._conn.executemany("DELETE FROM questions WHERE session_id = ?", [(sid,) for sid in session_ids])
+        self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(sid,) for sid in session_ids])
+        stale = set(session_ids)
+        for key in [key for key in self._cache if key[0] in stale]:
+            del self._cache[key]
+
 class QuizManager:
-    def __init__(self, questions: list):
+    def __init__(self, questions: list = None, store: QuizSessionStore = None, session_id: str = None):
         """
-        Initializes the QuizManager class with a list of quiz questions.
+        Initializes the QuizManager class with either a list of quiz questions, or a QuizSessionStore
+        and session id from which questions are paged in by index.
         """
         self.questions = questions
-        self.total_questions = len(questions)
+        self.store = store
+        self.session_id = session_id
+        if store is not None:
+            self.total_questions = store.question_count(session_id)
+        else:
+            self.total_questions = len(questions)
     
     def get_question_at_index(self, index: int):
         """
@@ -22,6 +210,8 @@ class QuizManager:
         it restarts from the beginning index.
         """
         valid_index = index % self.total_questions
+        if self.store is not None:
+            return self.store.get_question(self.session_id, valid_index)
         return self.questions[valid_index]
 
     def next_question_index(self, direction=1):